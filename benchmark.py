@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+"""
+Benchmark every pipeline stage across instance sizes.
+
+Each dataset goes through the stages of a solve, timed separately:
+trip parsing, distance matrix parsing, compatibility, graph build, every
+solver backend on both objectives, and route decoding. Every stage runs
+--repeat times for timing, then once more under tracemalloc for its peak
+memory (tracing slows pure-Python code down, so it never runs during the
+timed repeats). Solver stages get a fresh copy of the graph each time, so
+warm starts do not leak between repeats.
+
+Solution values are compared across backends (NetworkX, array-based
+simplex, Hopcroft-Karp matching, PuLP/CBC, HiGHS LP relaxation); any
+disagreement is reported.
+Results go to a JSON file that can be compared with a stored baseline:
+slowdowns and memory growth above the thresholds, and any change in a
+solution value, are reported as regressions (exit status 1).
+
+Usage:
+    python benchmark.py --max-trips 3000 --repeat 5
+    python benchmark.py --save-baseline results/benchmark_baseline.json
+    python benchmark.py --baseline results/benchmark_baseline.json
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from utils import load_distance_matrix, load_trip_table, compatible_pairs
+from graph import build_flow_graph
+from timespace import build_time_space_graph
+from matching import minimum_fleet
+from routes import decode_routes
+from instance import ProblemInstance
+from minimize_fleet_ilp import solve_minimize_fleet_ilp
+from minimize_distance_ilp import solve_minimize_distance_ilp
+from ilp_model import solve_flow_relaxation
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DATASETS = [
+    ("d1", "data/small/d1.txt", 'trip'),
+    ("d2", "data/medium/d2.txt", 'trip'),
+    ("d3", "data/large/d3.txt", 'trip'),
+    ("synthetic_1500", "data/large/synthetic_1500.txt", 'trip'),
+    ("synthetic_2000", "data/large/synthetic_2000.txt", 'trip'),
+    ("synthetic_3000", "data/large/synthetic_3000.txt", 'trip'),
+    # Out of reach of the quadratic trip-to-trip network
+    ("synthetic_5000", "data/large/synthetic_5000.txt", 'time-space'),
+    ("synthetic_10000", "data/large/synthetic_10000.txt", 'time-space'),
+]
+
+BACKENDS = ('networkx', 'simplex', 'matching', 'pulp', 'highs')
+
+
+def peak_rss():
+    """High-water mark of the process resident set size in bytes (None if unknown)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure(stage, repeat, setup=None):
+    """
+    Time a stage over repeated runs, then trace one more run for its memory.
+
+    Args:
+        stage: Callable run for every repeat; receives setup() when given
+        repeat: Number of timed runs
+        setup: Untimed callable building the argument of each run
+
+    Returns:
+        result: Return value of the last run
+        stats: Dict with min/median seconds and peak memory in bytes
+    """
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        gc.collect()
+        start = time.perf_counter()
+        result = stage(argument) if setup is not None else stage()
+        times.append(time.perf_counter() - start)
+
+    argument = setup() if setup is not None else None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        stage(argument) if setup is not None else stage()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, {
+        'repeat': repeat,
+        'time_min': round(min(times), 6),
+        'time_median': round(statistics.median(times), 6),
+        'peak_traced_bytes': int(peak),
+        'peak_rss_bytes': peak_rss(),
+    }
+
+
+def _quiet(function, *args, **kwargs):
+    """Call function with its prints and warnings swallowed (the ILP solvers report to stdout)."""
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return function(*args, **kwargs)
+
+
+def _solvers(instance, network, backends, pulp_max_trips):
+    """(objective, backend, solve) for every applicable backend; solve(graph) -> (flowCost, flow)."""
+    number_of_trips = instance.number_of_trips
+
+    def flow_solver(objective, backend):
+        def solve(graph):
+            _, flowCost, flow = graph.solve(graph.cost(objective), number_of_trips, backend)
+            return flowCost, flow
+        return solve
+
+    def matching(graph):
+        used_taxis, _, flow = minimum_fleet(graph, number_of_trips)
+        return used_taxis - number_of_trips, flow
+
+    def pulp_fleet(graph):
+        return _quiet(solve_minimize_fleet_ilp, instance, graph), None
+
+    def pulp_distance(graph):
+        return _quiet(solve_minimize_distance_ilp, instance, graph), None
+
+    def relaxation(objective):
+        def solve(graph):
+            flowCost, flow, _ = solve_flow_relaxation(graph, graph.cost(objective), number_of_trips)
+            return flowCost, flow
+        return solve
+
+    solvers = []
+    for backend in backends:
+        if backend in ('networkx', 'simplex'):
+            solvers += [(objective, backend, flow_solver(objective, backend)) for objective in ('fleet', 'distance')]
+        elif backend == 'matching' and network == 'trip':
+            solvers.append(('fleet', backend, matching))
+        elif backend == 'pulp' and number_of_trips <= pulp_max_trips:
+            solvers += [('fleet', backend, pulp_fleet), ('distance', backend, pulp_distance)]
+        elif backend == 'highs' and number_of_trips <= pulp_max_trips:
+            solvers += [(objective, backend, relaxation(objective)) for objective in ('fleet', 'distance')]
+    return solvers
+
+
+def benchmark_dataset(name, trip_file, matrix_file, network, repeat, backends, pulp_max_trips):
+    """Run every stage on one dataset; returns its result record."""
+    print(f"\n=== {name} ({network} network) ===")
+    stages = {}
+
+    def run(stage_name, stage, setup=None):
+        result, stats = measure(stage, repeat, setup)
+        stages[stage_name] = stats
+        print(f"  {stage_name:<24} {stats['time_median']:>10.4f}s  {stats['peak_traced_bytes'] / 2**20:>9.1f} MiB")
+        return result
+
+    trips = run('load_trips', lambda: load_trip_table(trip_file))
+    distances = run('load_distances', lambda: load_distance_matrix(matrix_file, cache=False))
+    instance = ProblemInstance(trips, distances)
+
+    constraint_mode = 'simple' if network == 'time-space' else 'combined'
+    if network == 'time-space':
+        graph = run('graph_build', lambda: build_time_space_graph(trips, distances))
+    else:
+        run('compatibility', lambda: sum(len(tails) for tails, _ in compatible_pairs(trips, distances, constraint_mode)))
+        graph = run('graph_build', lambda: build_flow_graph(trips, distances, constraint_mode))
+
+    # Every solve starts from a fresh copy of the graph (no cached solver state)
+    fresh = lambda: graph.subgraph(np.ones(graph.number_of_edges, dtype=bool))
+    values = {'fleet': {}, 'distance': {}}
+    fleet_flow = None
+    for objective, backend, solve in _solvers(instance, network, backends, pulp_max_trips):
+        flowCost, flow = run(f'solve_{objective}_{backend}', solve, fresh)
+        values[objective][backend] = int(flowCost)
+        if objective == 'fleet' and flow is not None:
+            fleet_flow = flow
+
+    if fleet_flow is not None:
+        run('decode', lambda: decode_routes(instance, graph, fleet_flow))
+
+    mismatches = [
+        f"{objective}: " + ", ".join(f"{backend}={value}" for backend, value in by_backend.items())
+        for objective, by_backend in values.items() if len(set(by_backend.values())) > 1
+    ]
+    for mismatch in mismatches:
+        print(f"  MISMATCH {mismatch}")
+
+    return {
+        'trips_file': trip_file,
+        'num_trips': instance.number_of_trips,
+        'network': network,
+        'constraint_mode': constraint_mode,
+        'network_edges': graph.number_of_edges,
+        'stages': stages,
+        'values': values,
+        'mismatches': mismatches,
+    }
+
+
+def compare(results, baseline, time_threshold, memory_threshold, min_time):
+    """
+    Regressions of results against a baseline.
+
+    A stage regresses when its median time grows by more than time_threshold
+    (relative, stages under min_time seconds in both runs are ignored as
+    noise) or its traced peak memory by more than memory_threshold; any
+    changed solution value is a regression.
+
+    Returns:
+        regressions: List of human-readable regression messages
+    """
+    regressions = []
+    for name, current in results['datasets'].items():
+        previous = baseline['datasets'].get(name)
+        if previous is None:
+            continue
+        for stage, stats in current['stages'].items():
+            old = previous['stages'].get(stage)
+            if old is None:
+                continue
+            new_time, old_time = stats['time_median'], old['time_median']
+            if max(new_time, old_time) >= min_time and new_time > old_time * (1 + time_threshold):
+                regressions.append(f"{name} {stage}: time {old_time:.4f}s -> {new_time:.4f}s")
+            new_memory, old_memory = stats['peak_traced_bytes'], old['peak_traced_bytes']
+            if new_memory > old_memory * (1 + memory_threshold) and new_memory - old_memory > 2**20:
+                regressions.append(f"{name} {stage}: memory {old_memory / 2**20:.1f} -> {new_memory / 2**20:.1f} MiB")
+        for objective, by_backend in current['values'].items():
+            for backend, value in by_backend.items():
+                old_value = previous['values'].get(objective, {}).get(backend)
+                if old_value is not None and old_value != value:
+                    regressions.append(f"{name} {objective}/{backend}: value {old_value} -> {value}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage")
+    parser.add_argument('--datasets', nargs='+', choices=[name for name, _, _ in DATASETS],
+                        help='Datasets to run (default: all)')
+    parser.add_argument('--max-trips', type=int, default=None,
+                        help='Skip datasets with more trips than this')
+    parser.add_argument('--repeat', '-r', type=int, default=3, help='Timed runs per stage')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS),
+                        help='Solver backends to compare')
+    parser.add_argument('--pulp-max-trips', type=int, default=1000,
+                        help='Largest dataset solved with PuLP and HiGHS')
+    parser.add_argument('--distance', '-d', default='data/distance_matrix.txt', help='Distance matrix file')
+    parser.add_argument('--output', '-o', default='results/benchmark.json', help='Results file')
+    parser.add_argument('--baseline', help='Baseline results file to compare against')
+    parser.add_argument('--save-baseline', metavar='PATH', help='Also write the results as a baseline')
+    parser.add_argument('--time-threshold', type=float, default=0.25,
+                        help='Allowed relative slowdown of a stage (0.25 = 25%%)')
+    parser.add_argument('--memory-threshold', type=float, default=0.25,
+                        help='Allowed relative growth of the peak memory of a stage')
+    parser.add_argument('--min-time', type=float, default=0.01,
+                        help='Stages faster than this (seconds) are not checked for time')
+    args = parser.parse_args()
+
+    results = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'datasets': {},
+    }
+    for name, trip_file, network in DATASETS:
+        if args.datasets and name not in args.datasets:
+            continue
+        if not os.path.exists(trip_file):
+            print(f"Warning: {trip_file} not found, skipping...")
+            continue
+        if args.max_trips is not None and len(load_trip_table(trip_file)) > args.max_trips:
+            continue
+        results['datasets'][name] = benchmark_dataset(
+            name, trip_file, args.distance, network, args.repeat, args.backends, args.pulp_max_trips
+        )
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to: {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.time_threshold, args.memory_threshold, args.min_time)
+        print(f"\n=== Regressions against {args.baseline}: {len(regressions)} ===")
+        for regression in regressions:
+            print(f"  {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
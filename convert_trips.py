@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""
+Convert a trips file to the binary columnar format.
+
+The output .npy file stores the start_min, end_min, pickup and dropoff
+columns as int32. utils.load_trip_table memory-maps it, so later runs skip
+parsing entirely. Text inputs may be gzip-compressed (*.gz).
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from utils import load_trip_table, save_trip_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert trips to the binary columnar format')
+    parser.add_argument('input', type=str, help='Trips file (.txt or .txt.gz)')
+    parser.add_argument('--output', '-o', type=str, default=None,
+                        help='Output .npy path (default: input path with a .npy extension)')
+    args = parser.parse_args()
+
+    output_path = args.output
+    if output_path is None:
+        base = args.input[:-3] if args.input.endswith('.gz') else args.input
+        output_path = os.path.splitext(base)[0] + '.npy'
+
+    start = time.time()
+    trips = load_trip_table(args.input)
+    save_trip_table(trips, output_path)
+
+    print(f"Saved {len(trips)} trips to {output_path} ({time.time() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
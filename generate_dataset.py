@@ -2,70 +2,164 @@
 """
 Generate synthetic taxi trip datasets for testing.
 
-This script generates random trip data with realistic constraints:
-- Trips occur between 6:00 AM and 10:00 PM
-- Trip durations range from 10 to 60 minutes
-- Locations are randomly assigned from the available locations
+Trips are drawn with NumPy in one vectorized pass, so millions of trips take
+seconds:
+- Start times follow an hourly demand profile ('uniform': 6:00 AM to
+  8:00 PM as before, 'rush-hour': morning and evening peaks over a day-long
+  base), repeated over --days days
+- Pickup and dropoff are distinct locations other than the depot (location
+  1), optionally with skewed zone popularity (--zone-skew)
+- Trip durations range from 10 to 60 minutes, or, when a distance matrix is
+  generated with the trips, are the driving time plus 0 to 15 minutes
+
+--distance-output also writes a matching synthetic distance matrix for
+--locations zones: Euclidean distances between random points, scaled by
+random noise, in the triangular or full text layout. Trips (.npy) and
+distances (.npy) can be written in the binary formats directly.
 """
 
-import random
 import argparse
+import gzip
 import os
+import sys
 
+import numpy as np
 
-def generate_trips(num_trips, num_locations=10, seed=42):
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from utils import save_distance_matrix, save_trip_table
+
+# Hourly demand weights of every profile (index = hour of the day)
+DEMAND_PROFILES = {
+    # 6:00 AM to 8:00 PM, flat (allow 2 hours for the last trips)
+    'uniform': np.array([0] * 6 + [1] * 14 + [0] * 4, dtype=np.float64),
+    # Night base, day base, 7-9 AM and 5-7 PM peaks
+    'rush-hour': np.array(
+        [1, 1, 1, 1, 1, 2, 4, 9, 10, 7, 5, 5, 6, 5, 5, 6, 8, 10, 9, 7, 5, 4, 3, 2], dtype=np.float64),
+}
+
+# Minutes per day of the start time horizon
+DAY_MINUTES = 24 * 60
+
+# Trips formatted per chunk when writing text files
+WRITE_CHUNK_SIZE = 1 << 20
+
+# gzip level of compressed text trip files
+GZIP_LEVEL = 1
+
+# Side of the square the zones are drawn in, in minutes of driving
+ZONE_EXTENT = 15
+
+
+def generate_distance_matrix(num_locations, seed=42, extent=ZONE_EXTENT, noise=0.2, symmetric=True):
     """
-    Generate synthetic trip data.
+    Generate a synthetic distance matrix.
+
+    Locations are random points in an extent x extent square; the distance
+    between two of them is their Euclidean distance, scaled by a random
+    factor in [1, 1 + noise] and rounded (at least 1 between distinct
+    locations).
 
     Args:
-        num_trips: Number of trips to generate
-        num_locations: Number of locations (excluding depot at index 1)
+        num_locations: Number of locations (the depot is location 1)
         seed: Random seed for reproducibility
+        extent: Side of the square in minutes
+        noise: Largest relative detour over the straight line
+        symmetric: Same distance in both directions (needed by the triangular layout)
 
     Returns:
-        List of trips as (start_time, end_time, pickup, dropoff)
+        distances: (num_locations + 1) x (num_locations + 1) int32 array (row and column 0 unused)
     """
-    random.seed(seed)
-    trips = []
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, extent, size=(num_locations, 2))
+    euclidean = np.hypot(points[:, None, 0] - points[None, :, 0], points[:, None, 1] - points[None, :, 1])
+    detour = rng.uniform(1, 1 + noise, size=(num_locations, num_locations))
+    if symmetric:
+        detour = np.triu(detour) + np.triu(detour, 1).T
 
-    # Operating hours: 6:00 AM to 10:00 PM (360 to 1320 minutes)
-    min_start = 6 * 60   # 6:00 AM in minutes
-    max_start = 20 * 60  # 8:00 PM in minutes (allow 2 hours for last trips)
+    distances = np.zeros((num_locations + 1, num_locations + 1), dtype=np.int32)
+    distances[1:, 1:] = np.maximum(np.rint(euclidean * detour), 1)
+    np.fill_diagonal(distances, 0)
+    return distances
 
-    for _ in range(num_trips):
-        # Random start time
-        start_minutes = random.randint(min_start, max_start)
 
-        # Trip duration: 10 to 60 minutes
-        duration = random.randint(10, 60)
-        end_minutes = start_minutes + duration
-
-        # Convert to HHMM format
-        start_time = (start_minutes // 60) * 100 + (start_minutes % 60)
-        end_time = (end_minutes // 60) * 100 + (end_minutes % 60)
+def generate_trips(num_trips, num_locations=10, seed=42, profile='uniform', days=1, distances=None, zone_skew=0.0):
+    """
+    Generate synthetic trip data.
 
-        # Random pickup and dropoff (locations 2 to num_locations, excluding depot at 1)
-        pickup = random.randint(2, num_locations)
-        dropoff = random.randint(2, num_locations)
-        while dropoff == pickup:
-            dropoff = random.randint(2, num_locations)
+    Args:
+        num_trips: Number of trips to generate
+        num_locations: Number of locations (the depot is location 1, trips use 2 to num_locations)
+        seed: Random seed for reproducibility
+        profile: Hourly demand profile (see DEMAND_PROFILES)
+        days: Number of days of the horizon
+        distances: Distance matrix the trips are drawn for; trip durations
+                   are then the driving time plus 0 to 15 minutes
+        zone_skew: Spread of the zone popularity (sigma of a lognormal
+                   weight per zone; 0 for uniform zones)
 
-        trips.append((start_time, end_time, pickup, dropoff))
+    Returns:
+        trips: (n, 4) int32 array with columns start_min, end_min, pickup,
+               dropoff (see utils.load_trip_table), sorted by start time
+    """
+    if num_locations < 3:
+        raise ValueError("At least 3 locations are needed (the depot and two trip zones)")
+    rng = np.random.default_rng(seed)
+
+    # Start time: day, then hour by demand, then minute
+    weights = DEMAND_PROFILES[profile]
+    day = rng.integers(0, days, size=num_trips)
+    hour = rng.choice(24, size=num_trips, p=weights / weights.sum())
+    start = day * DAY_MINUTES + hour * 60 + rng.integers(0, 60, size=num_trips)
+
+    # Pickup and dropoff among locations 2 to num_locations, never equal
+    zones = num_locations - 1
+    popularity = rng.lognormal(0, zone_skew, size=zones) if zone_skew > 0 else np.ones(zones)
+    popularity /= popularity.sum()
+    pickup = rng.choice(zones, size=num_trips, p=popularity)
+    dropoff = rng.choice(zones, size=num_trips, p=popularity)
+    same = np.flatnonzero(pickup == dropoff)
+    while len(same):
+        dropoff[same] = rng.choice(zones, size=len(same), p=popularity)
+        same = same[pickup[same] == dropoff[same]]
+    pickup += 2
+    dropoff += 2
+
+    if distances is None:
+        # Trip duration: 10 to 60 minutes
+        duration = rng.integers(10, 61, size=num_trips)
+    else:
+        duration = np.maximum(np.asarray(distances)[pickup, dropoff] + rng.integers(0, 16, size=num_trips), 1)
 
+    trips = np.stack((start, start + duration, pickup, dropoff), axis=1).astype(np.int32)
     # Sort by start time
-    trips.sort(key=lambda x: x[0])
-
-    return trips
+    return trips[np.argsort(trips[:, 0], kind='stable')]
 
 
 def save_trips(trips, filepath):
-    """Save trips to file in the expected format."""
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    """
+    Save trips to file in the expected format.
 
-    with open(filepath, 'w') as f:
-        f.write(f"{len(trips)}\n")
-        for start, end, pickup, dropoff in trips:
-            f.write(f"{start},{end},{pickup},{dropoff}\n")
+    .npy writes the binary columnar format (see utils.save_trip_table);
+    anything else the text format with HHMM times (gzip-compressed for .gz).
+    Hours past midnight of later days continue counting (e.g. 3215 is
+    8:15 AM of the second day).
+    """
+    os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+
+    if filepath.endswith('.npy'):
+        save_trip_table(trips, filepath)
+    else:
+        # Fast gzip level: compressing at the default level 9 takes longer than formatting
+        f = gzip.open(filepath, 'wb', compresslevel=GZIP_LEVEL) if filepath.endswith('.gz') else open(filepath, 'wb')
+        with f:
+            f.write(f"{len(trips)}\n".encode())
+            for first in range(0, len(trips), WRITE_CHUNK_SIZE):
+                chunk = np.array(trips[first:first + WRITE_CHUNK_SIZE], dtype=np.int64)
+                # Convert minutes to HHMM format
+                chunk[:, :2] = chunk[:, :2] // 60 * 100 + chunk[:, :2] % 60
+                np.savetxt(f, chunk, fmt='%d', delimiter=',')
 
     print(f"Saved {len(trips)} trips to {filepath}")
 
@@ -75,11 +169,35 @@ def main():
     parser.add_argument('--trips', type=int, default=1000, help='Number of trips to generate')
     parser.add_argument('--locations', type=int, default=10, help='Number of locations')
     parser.add_argument('--seed', type=int, default=42, help='Random seed')
-    parser.add_argument('--output', type=str, default=None, help='Output file path')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Output file path (.txt, .txt.gz, or .npy for the binary format)')
+    parser.add_argument('--profile', choices=sorted(DEMAND_PROFILES), default='uniform',
+                        help='Hourly demand profile of the start times')
+    parser.add_argument('--days', type=int, default=1, help='Number of days of the horizon')
+    parser.add_argument('--zone-skew', type=float, default=0.0,
+                        help='Spread of the zone popularity (0: every zone equally likely)')
+    parser.add_argument('--distance-output', type=str, default=None,
+                        help='Also generate a distance matrix for --locations zones (.txt, or .npy for '
+                             'the binary format); trip durations then follow its driving times')
+    parser.add_argument('--layout', choices=('triangular', 'full'), default='triangular',
+                        help="Rows of the text distance matrix ('full' allows asymmetric distances)")
+    parser.add_argument('--noise', type=float, default=0.2,
+                        help='Largest relative detour of a distance over the straight line')
+    parser.add_argument('--asymmetric', action='store_true',
+                        help='Draw the detour of each direction separately (needs --layout full for text)')
     args = parser.parse_args()
 
+    # Generate the distance matrix first: trip durations follow it
+    distances = None
+    if args.distance_output:
+        distances = generate_distance_matrix(args.locations, args.seed, noise=args.noise,
+                                             symmetric=not args.asymmetric)
+        os.makedirs(os.path.dirname(args.distance_output) or '.', exist_ok=True)
+        save_distance_matrix(distances, args.distance_output, args.layout)
+        print(f"Saved {args.locations} x {args.locations} distance matrix to {args.distance_output}")
+
     # Generate trips
-    trips = generate_trips(args.trips, args.locations, args.seed)
+    trips = generate_trips(args.trips, args.locations, args.seed, args.profile, args.days, distances, args.zone_skew)
 
     # Determine output path
     if args.output:
@@ -100,10 +218,12 @@ def main():
     print(f"\nDataset Statistics:")
     print(f"  Total trips: {len(trips)}")
     print(f"  Locations: {args.locations}")
+    print(f"  Days: {args.days} ({args.profile} demand)")
 
-    start_times = [t[0] for t in trips]
-    print(f"  First trip: {min(start_times)//100:02d}:{min(start_times)%100:02d}")
-    print(f"  Last trip: {max(start_times)//100:02d}:{max(start_times)%100:02d}")
+    if len(trips):
+        first, last = int(trips[0, 0]), int(trips[-1, 0])
+        print(f"  First trip: day {first // DAY_MINUTES + 1} {first % DAY_MINUTES // 60:02d}:{first % 60:02d}")
+        print(f"  Last trip: day {last // DAY_MINUTES + 1} {last % DAY_MINUTES // 60:02d}:{last % 60:02d}")
 
 
 if __name__ == "__main__":
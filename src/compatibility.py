@@ -0,0 +1,330 @@
+"""
+Range-encoded trip compatibility index.
+
+Every constraint mode can be written as one or two rules of the form
+
+    trip j can follow trip i  <=>  key[j] >= base[i] + D(dropoff_i, pickup_j)
+
+For a fixed pickup location the right-hand side only depends on trip i, so
+once the trips are grouped by pickup location and sorted by key, the
+successors of trip i are a suffix of every group. The index stores one
+offset per (trip, location) pair, i.e. O(n * m) memory, instead of the
+O(n^2) back_edge list produced by pre_processing.
+
+PackedCompatibility is the dense counterpart for solving several modes on
+the same trips. Every rule is a base predicate
+
+    trip j can follow trip i  <=>  ready[i] + D(dropoff_i, pickup_j) <= due[j]
+
+('simple', 'end_time' and 'start_time'; 'combined' is the OR of the last
+two). pack_compatibility() evaluates all the base predicates the requested
+modes need in one pass over blocks of rows, sharing the distance lookups,
+and stores each as an n x n bit matrix (n^2 / 8 bytes). Any mode is then a
+bitwise OR of rows, and the compatible pairs are unpacked a block at a time
+only when a network is built from them.
+"""
+
+import numpy as np
+
+import tracing
+from utils import PAIR_CHUNK_SIZE, check_memory, trips_to_arrays, distance_array
+
+# Base predicates of every constraint mode (a pair is compatible when any holds)
+MODE_PREDICATES = {
+    'simple': ('simple',),
+    'end_time': ('end_time',),
+    'start_time': ('start_time',),
+    'combined': ('end_time', 'start_time'),
+}
+
+# Number of set bits of every byte value
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def _rules(constraint_mode, start, end, trip_time):
+    """Return the (key, base) arrays describing constraint_mode."""
+    end_rule = (end - trip_time, end)
+    start_rule = (start, start + trip_time)
+    if constraint_mode == 'simple':
+        return [(start, end)]
+    if constraint_mode == 'end_time':
+        return [end_rule]
+    if constraint_mode == 'start_time':
+        return [start_rule]
+    return [end_rule, start_rule]  # combined (default)
+
+
+class _RangeRule:
+    """Suffix-range encoding of a single key >= threshold rule."""
+
+    def __init__(self, key, base, pickup, dropoff, locations, dense):
+        number_of_trips = len(key)
+        location_of = np.searchsorted(locations, pickup)
+
+        # Successor side: trips grouped by pickup location, sorted by key
+        self.order = np.lexsort((key, location_of)).astype(np.int32)
+        self.sorted_key = key[self.order]
+        self.bounds = np.searchsorted(location_of[self.order], np.arange(len(locations) + 1)).astype(np.int32)
+
+        # threshold[i, k]: smallest key a trip picked up at location k needs to follow trip i
+        threshold = base[:, None] + dense[dropoff[:, None], locations[None, :]]
+        self.first = np.empty((number_of_trips, len(locations)), dtype=np.int32)
+
+        # Predecessor side: thresholds per location, sorted
+        self.pred_order = np.empty((len(locations), number_of_trips), dtype=np.int32)
+        self.sorted_threshold = np.empty((len(locations), number_of_trips), dtype=threshold.dtype)
+
+        for k in range(len(locations)):
+            low, high = self.bounds[k], self.bounds[k + 1]
+            self.first[:, k] = low + np.searchsorted(self.sorted_key[low:high], threshold[:, k], side='left')
+            self.pred_order[k] = np.argsort(threshold[:, k], kind='stable')
+            self.sorted_threshold[k] = threshold[self.pred_order[k], k]
+
+        self.key = key
+        self.location_of = location_of
+        # A trip lies inside its own successor range (and so do its identical copies)
+        self.self_compatible = key >= threshold[np.arange(number_of_trips), location_of]
+
+    def successors(self, i):
+        ranges = [self.order[self.first[i, k]:self.bounds[k + 1]] for k in range(len(self.bounds) - 1)]
+        return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int32)
+
+    def predecessors(self, j):
+        k = self.location_of[j]
+        count = np.searchsorted(self.sorted_threshold[k], self.key[j], side='right')
+        return self.pred_order[k][:count]
+
+    def range_counts(self, k):
+        """Number of trips at location k inside the range of each trip."""
+        return self.bounds[k + 1] - self.first[:, k]
+
+
+def _dominance_counts(first_a, first_b, rank_a, rank_b, size):
+    """
+    Count, for every query, the points inside both suffix ranges.
+
+    Points are the trips of one location, identified by their ranks in the two
+    sorted orders. Query q covers ranks >= first_a[q] in order a and ranks
+    >= first_b[q] in order b; the intersection is counted offline with a
+    Fenwick tree over the b ranks while sweeping the a ranks downwards.
+    """
+    tree = [0] * (size + 1)
+    points = sorted(zip(rank_a, rank_b), reverse=True)
+    queries = sorted(range(len(first_a)), key=lambda q: first_a[q], reverse=True)
+    counts = np.zeros(len(first_a), dtype=np.int64)
+
+    inserted = 0
+    for q in queries:
+        while inserted < len(points) and points[inserted][0] >= first_a[q]:
+            position = points[inserted][1] + 1
+            while position <= size:
+                tree[position] += 1
+                position += position & -position
+            inserted += 1
+        # points with b rank < first_b[q]
+        below = 0
+        position = first_b[q]
+        while position > 0:
+            below += tree[position]
+            position -= position & -position
+        counts[q] = inserted - below
+    return counts
+
+
+class CompatibilityIndex:
+    """
+    Implicit trip compatibility graph with successor and predecessor queries.
+
+    Trips are addressed by their 0-based position in the trips list, so trip i
+    corresponds to the nodes "trip_<i+1>_end" / "trip_<i+1>_start". Queries
+    return the same pairs as pre_processing with the same constraint_mode.
+    """
+
+    def __init__(self, trips, distances, constraint_mode='combined'):
+        start, end, pickup, dropoff = trips_to_arrays(trips)
+        dense = distance_array(distances)
+        trip_time = dense[pickup, dropoff]
+
+        self.constraint_mode = constraint_mode
+        self.number_of_trips = len(start)
+        self.locations = np.unique(pickup)
+        self.rules = [
+            _RangeRule(key, base, pickup, dropoff, self.locations, dense)
+            for key, base in _rules(constraint_mode, start, end, trip_time)
+        ]
+
+        # Identical trips are never chained to each other
+        table = np.stack((start, end, pickup, dropoff), axis=1)
+        _, group, group_size = np.unique(table, axis=0, return_inverse=True, return_counts=True)
+        self.group = group.reshape(-1)
+        self.group_size = group_size[self.group]
+
+    def _exclude_identical(self, i, candidates):
+        return candidates[self.group[candidates] != self.group[i]]
+
+    def successors(self, i):
+        """Trips that can follow trip i, in increasing order."""
+        result = self.rules[0].successors(i)
+        for rule in self.rules[1:]:
+            result = np.union1d(result, rule.successors(i))
+        return np.sort(self._exclude_identical(i, result))
+
+    def predecessors(self, j):
+        """Trips that trip j can follow, in increasing order."""
+        result = self.rules[0].predecessors(j)
+        for rule in self.rules[1:]:
+            result = np.union1d(result, rule.predecessors(j))
+        return np.sort(self._exclude_identical(j, result))
+
+    def out_degrees(self):
+        """Number of successors of every trip."""
+        degrees = np.zeros(self.number_of_trips, dtype=np.int64)
+        for k in range(len(self.locations)):
+            for rule in self.rules:
+                degrees += rule.range_counts(k)
+            if len(self.rules) == 2:
+                # inclusion-exclusion for the union of the two ranges
+                degrees -= self._intersection_counts(k)
+
+        self_compatible = self.rules[0].self_compatible
+        for rule in self.rules[1:]:
+            self_compatible = self_compatible | rule.self_compatible
+        degrees -= np.where(self_compatible, self.group_size, 0)
+        return degrees
+
+    def _intersection_counts(self, k):
+        rule_a, rule_b = self.rules
+        low, high = rule_a.bounds[k], rule_a.bounds[k + 1]
+        members = rule_a.order[low:high]
+        # rank of every member inside the location group of each sorted order
+        rank_b = np.empty(self.number_of_trips, dtype=np.int64)
+        rank_b[rule_b.order[low:high]] = np.arange(high - low)
+        return _dominance_counts(
+            (rule_a.first[:, k] - low).tolist(),
+            (rule_b.first[:, k] - low).tolist(),
+            list(range(high - low)),
+            rank_b[members].tolist(),
+            high - low,
+        )
+
+    @tracing.traced('compatibility')
+    def count_edges(self):
+        """Number of compatible (i, j) pairs, without materializing them."""
+        return int(self.out_degrees().sum())
+
+
+def _predicates(start, end, trip_time):
+    """Return the (ready, due) arrays of every base predicate."""
+    return {
+        'simple': (end, start),
+        'end_time': (end, end - trip_time),
+        'start_time': (start + trip_time, start),
+    }
+
+
+class PackedCompatibility:
+    """
+    Bit-packed compatibility matrices of the base predicates.
+
+    Attributes:
+        number_of_trips: Number of trips n
+        bits: Dict of base predicate -> (n, ceil(n / 8)) uint8 array; bit j
+              (little-endian bit order) of row i is set when trip j can follow
+              trip i under that predicate
+    """
+
+    def __init__(self, number_of_trips, bits):
+        self.number_of_trips = number_of_trips
+        self.bits = bits
+
+    @property
+    def nbytes(self):
+        return sum(matrix.nbytes for matrix in self.bits.values())
+
+    def supports(self, constraint_mode):
+        """Whether every base predicate of constraint_mode was computed."""
+        return all(predicate in self.bits for predicate in MODE_PREDICATES[constraint_mode])
+
+    def packed_rows(self, constraint_mode, rows=slice(None)):
+        """Packed compatibility rows of constraint_mode (the OR of its predicates)."""
+        first, *others = MODE_PREDICATES[constraint_mode]
+        packed = self.bits[first][rows]
+        for predicate in others:
+            packed = packed | self.bits[predicate][rows]
+        return packed
+
+    def _row_chunks(self, chunk_size):
+        rows_per_chunk = max(1, chunk_size // max(self.number_of_trips, 1))
+        for first in range(0, self.number_of_trips, rows_per_chunk):
+            yield slice(first, min(first + rows_per_chunk, self.number_of_trips))
+
+    def out_degrees(self, constraint_mode, chunk_size=PAIR_CHUNK_SIZE):
+        """Number of successors of every trip under constraint_mode."""
+        degrees = np.empty(self.number_of_trips, dtype=np.int64)
+        for rows in self._row_chunks(chunk_size):
+            degrees[rows] = _POPCOUNT[self.packed_rows(constraint_mode, rows)].sum(axis=1, dtype=np.int64)
+        return degrees
+
+    def count_edges(self, constraint_mode):
+        """Number of compatible (i, j) pairs under constraint_mode."""
+        return int(self.out_degrees(constraint_mode).sum())
+
+    def pairs(self, constraint_mode, chunk_size=PAIR_CHUNK_SIZE):
+        """
+        Generate the compatible trip pairs of constraint_mode in chunks.
+
+        Same pairs, in the same order, as utils.compatible_pairs.
+
+        Yields:
+            tails, heads: int64 arrays of 0-based trip ids, trip heads[k] can follow trip tails[k]
+        """
+        for rows in self._row_chunks(chunk_size):
+            mask = np.unpackbits(
+                self.packed_rows(constraint_mode, rows), axis=1, count=self.number_of_trips, bitorder='little')
+            tails, heads = np.nonzero(mask)
+            yield tails + rows.start, heads
+
+
+@tracing.traced('compatibility', kind='packed')
+def pack_compatibility(trips, distances, constraint_modes=('combined',), max_memory=None, chunk_size=PAIR_CHUNK_SIZE):
+    """
+    Evaluate the base predicates of several constraint modes in one pass.
+
+    Args:
+        trips: List of trip data
+        distances: Distance matrix
+        constraint_modes: Modes to support (see MODE_PREDICATES)
+        max_memory: Memory ceiling in bytes; MemoryError is raised before
+                    anything is allocated when the bit matrices would not fit
+        chunk_size: Number of pairs checked per block of rows
+
+    Returns:
+        compatibility: PackedCompatibility
+    """
+    start, end, pickup, dropoff = trips_to_arrays(trips)
+    dense = distance_array(distances)
+    trip_time = dense[pickup, dropoff]
+    number_of_trips = len(start)
+    _, group = np.unique(np.stack((start, end, pickup, dropoff), axis=1), axis=0, return_inverse=True)
+    group = group.reshape(-1)
+
+    columns = _predicates(start, end, trip_time)
+    needed = [predicate for predicate in columns if any(predicate in MODE_PREDICATES[mode] for mode in constraint_modes)]
+    width = (number_of_trips + 7) // 8
+    check_memory(len(needed) * number_of_trips * width, max_memory,
+                 f"The packed compatibility matrices ({', '.join(needed)})")
+    bits = {predicate: np.empty((number_of_trips, width), dtype=np.uint8) for predicate in needed}
+
+    compatibility = PackedCompatibility(number_of_trips, bits)
+    for rows in compatibility._row_chunks(chunk_size):
+        # deadhead[i, j]: empty drive from the dropoff of trip i to the pickup of trip j
+        deadhead = dense[dropoff[rows, None], pickup[None, :]]
+        # Identical trips are never chained to each other (nor to themselves)
+        distinct = group[rows, None] != group[None, :]
+        for predicate in needed:
+            ready, due = columns[predicate]
+            mask = ready[rows, None] + deadhead <= due[None, :]
+            mask &= distinct
+            bits[predicate][rows] = np.packbits(mask, axis=1, bitorder='little')
+        tracing.count('compatibility.checks', deadhead.size)
+    return compatibility
@@ -0,0 +1,123 @@
+"""
+Pareto frontier of fleet size vs empty distance.
+
+Let f(k) be the minimum empty distance with at most k taxis. Removing one
+taxi from an optimal schedule means sending one more unit over the garbage
+edge, i.e. augmenting along the cheapest cycle through it: the garbage edge
+plus a shortest residual path parking_end -> parking_start. Successive
+shortest paths therefore walk f(k) from the unconstrained distance optimum
+down to the minimum fleet, one augmentation per taxi saved, instead of one
+full min-cost flow solve per fleet size. Path costs never decrease (f is
+convex), so every step is a Pareto point unless its cost is zero.
+"""
+
+import numpy as np
+
+from graph import GARBAGE_EDGE, PARKING_START, PARKING_END
+from network_simplex import NetworkSimplex
+
+UNREACHED = np.iinfo(np.int64).max
+
+
+def _shortest_path(graph, flow, capacity, reduced, usable):
+    """
+    Dijkstra from parking_end to parking_start in the residual network.
+
+    Args:
+        reduced: Non-negative reduced cost of every edge (forward direction)
+        usable: Edges that may be used (the garbage edge is excluded)
+
+    Returns:
+        dist: Distance label of every node (UNREACHED when not reached)
+        path: List of (edge, +1 forward / -1 backward) from parking_end, or None
+    """
+    dist = np.full(graph.number_of_nodes, UNREACHED, dtype=np.int64)
+    done = np.zeros(graph.number_of_nodes, dtype=bool)
+    pred_edge = np.full(graph.number_of_nodes, -1, dtype=np.int64)
+    pred_dir = np.zeros(graph.number_of_nodes, dtype=np.int8)
+    dist[PARKING_END] = 0
+
+    while True:
+        u = int(np.where(done, UNREACHED, dist).argmin())
+        if done[u] or dist[u] == UNREACHED:
+            return dist, None
+        done[u] = True
+        if u == PARKING_START:
+            break
+
+        # Forward residual edges (flow below capacity), then backward ones (flow above zero)
+        for edges, other, sign in (
+            (graph.edges_from(u), graph.head, 1),
+            (graph.edges_to(u), graph.tail, -1),
+        ):
+            if sign == 1:
+                edges = edges[usable[edges] & (flow[edges] < capacity[edges])]
+            else:
+                edges = edges[usable[edges] & (flow[edges] > 0)]
+            nodes = other[edges]
+            label = dist[u] + sign * reduced[edges]
+            better = (label < dist[nodes]) & ~done[nodes]
+            # Several edges may reach the same node: the last (smallest) label wins
+            order = np.argsort(-label[better], kind='stable')
+            edges, nodes, label = edges[better][order], nodes[better][order], label[better][order]
+            dist[nodes] = label
+            pred_edge[nodes] = edges
+            pred_dir[nodes] = sign
+
+    path = []
+    v = PARKING_START
+    while v != PARKING_END:
+        e, sign = int(pred_edge[v]), int(pred_dir[v])
+        path.append((e, sign))
+        v = int(graph.tail[e]) if sign == 1 else int(graph.head[e])
+    return dist, path
+
+
+def pareto_frontier(graph, number_of_trips=None):
+    """
+    All Pareto-optimal (taxis, empty distance) pairs of a fleet network.
+
+    Args:
+        graph: FlowGraph (trip-to-trip or time-space network)
+        number_of_trips: Parking supply (defaults to the graph's)
+
+    Returns:
+        frontier: List of (used_taxis, empty_distance), from the minimum
+                  fleet up to the fleet of the minimum-distance schedule
+    """
+    demand, capacity = graph.supply(number_of_trips)
+    cost = graph.cost('distance').astype(np.int64)
+    capacity = capacity.astype(np.int64)
+
+    # Start from a minimum-distance schedule and its optimal node potentials
+    simplex = NetworkSimplex(graph.tail, graph.head)
+    distance, edges, flows = simplex.solve(cost, capacity, demand)
+    flow = np.zeros(graph.number_of_edges, dtype=np.int64)
+    flow[edges] = flows
+    potential = simplex.potential.copy()
+
+    garbage = np.flatnonzero(graph.kind == GARBAGE_EDGE)[0]
+    usable = graph.kind != GARBAGE_EDGE
+    points = [(graph.used_taxis(flow, number_of_trips), distance)]
+
+    while flow[garbage] < capacity[garbage]:
+        reduced = cost + potential[graph.tail] - potential[graph.head]
+        dist, path = _shortest_path(graph, flow, capacity, reduced, usable)
+        if path is None:
+            break
+
+        # Keep the reduced costs non-negative for the next search
+        potential += np.minimum(dist, dist[PARKING_START])
+
+        for e, sign in path:
+            flow[e] += sign
+            distance += sign * int(cost[e])
+        flow[garbage] += 1
+        points.append((points[-1][0] - 1, distance))
+
+    # A step that saves a taxi at no extra distance dominates the point before it
+    frontier = [
+        (int(taxis), int(distance)) for (taxis, distance), following in zip(points, points[1:] + [None])
+        if following is None or following[1] != distance
+    ]
+    return frontier[::-1]
@@ -0,0 +1,405 @@
+"""
+Integer-indexed flow network shared by all solvers.
+
+Nodes are numbered in the order the NetworkX models used to add them:
+
+    0            parking_start
+    1            parking_end
+    2 + 2 * i    trip_<i+1>_start
+    3 + 2 * i    trip_<i+1>_end
+
+Edges live in parallel arrays (tail, head, capacity, cost, ...) in the order
+garbage edge, start edges, end edges, back edges, with CSR indexes over
+their tails and heads. Node names and NetworkX/PuLP objects are only built
+at the boundary, when a solver or a plot needs them.
+
+A FlowGraph is built once per (trips, constraint_mode) and reused: every
+objective is just a cost vector over the same edges (see cost()), and the
+solver state (NetworkX DiGraph or NetworkSimplex tree) is kept between
+solves, so Phase 2 and re-weightings neither rebuild the network nor, with
+the 'simplex' solver, restart from scratch.
+"""
+
+import copy
+
+import networkx as nx
+import numpy as np
+
+import tracing
+from compatibility import CompatibilityIndex
+from network_simplex import NetworkSimplex
+from utils import check_memory, compatible_pairs, distance_array, trips_to_arrays
+
+PARKING_START = 0
+PARKING_END = 1
+
+# Edge kinds
+GARBAGE_EDGE = 0
+START_EDGE = 1
+END_EDGE = 2
+BACK_EDGE = 3
+
+# Counter names of the edge kinds (indexed by kind)
+EDGE_KIND_NAMES = ('garbage', 'start', 'end', 'back')
+
+# Location of the parking depot in the distance matrix
+DEPOT = 1
+
+# Bytes per edge of a FlowGraph: six edge arrays (21 bytes), the two CSR
+# orders (8 bytes) and the argsort temporary of _csr (8 bytes)
+EDGE_BYTES = 37
+
+
+def start_node(trip):
+    """Node id of the start of trip (0-based)."""
+    return 2 + 2 * trip
+
+
+def end_node(trip):
+    """Node id of the end of trip (0-based)."""
+    return 3 + 2 * trip
+
+
+def node_trip(node):
+    """Trip (0-based) of a trip node id."""
+    return (node - 2) // 2
+
+
+def node_name(node):
+    """Name of a node id as used by the original string-based models."""
+    if node == PARKING_START:
+        return 'parking_start'
+    if node == PARKING_END:
+        return 'parking_end'
+    return "trip_" + str(node_trip(node) + 1) + ("_start" if node % 2 == 0 else "_end")
+
+
+def nonzero_flow(flow):
+    """
+    Edges carrying flow, in increasing edge id order.
+
+    Args:
+        flow: Dense flow array (one entry per edge) or an (edges, values)
+              pair as returned by FlowGraph.solve(..., sparse=True)
+
+    Returns:
+        edges, values: Ids of the edges with nonzero flow and their flows
+    """
+    if isinstance(flow, tuple):
+        return flow
+    edges = np.flatnonzero(flow)
+    return edges, flow[edges]
+
+
+def dense_flow(flow, number_of_edges):
+    """Dense flow array of a flow given in either form (see nonzero_flow)."""
+    if not isinstance(flow, tuple):
+        return flow
+    edges, values = flow
+    dense = np.zeros(number_of_edges, dtype=np.int32)
+    dense[edges] = values
+    return dense
+
+
+def _csr(keys, size):
+    """Return (indptr, order) grouping the positions of keys by value."""
+    order = np.argsort(keys, kind='stable').astype(np.int32)
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=indptr[1:])
+    return indptr, order
+
+
+class FlowGraph:
+    """
+    Fleet network over integer node ids.
+
+    Attributes:
+        number_of_trips: Number of trips
+        pickup, dropoff: Location of every trip (int32)
+        tail, head: Edge endpoints (int32)
+        kind: Edge kind (GARBAGE_EDGE, START_EDGE, END_EDGE or BACK_EDGE)
+        capacity: Edge capacity (int32)
+        distance: Empty distance driven along each edge (int32)
+        idle: Time a taxi spends between two trips along each edge (int32)
+        demand: Node demand in NetworkX convention (int32); networks with
+                extra nodes (see timespace.py) number them after the trip nodes
+        indptr, out_edges: CSR index of the edges leaving every node
+        in_indptr, in_edges: CSR index of the edges entering every node
+    """
+
+    def __init__(self, number_of_trips, pickup, dropoff, tail, head, kind, capacity, distance, idle, demand):
+        self.number_of_trips = number_of_trips
+        self.number_of_nodes = len(demand)
+        self.pickup = pickup
+        self.dropoff = dropoff
+        self.demand = demand
+        self._set_edges(tail, head, kind, capacity, distance, idle)
+
+    def _set_edges(self, tail, head, kind, capacity, distance, idle):
+        self.tail = tail
+        self.head = head
+        self.kind = kind
+        self.capacity = capacity
+        self.distance = distance
+        self.idle = idle
+        self.indptr, self.out_edges = _csr(tail, self.number_of_nodes)
+        self.in_indptr, self.in_edges = _csr(head, self.number_of_nodes)
+        # Solver state, built on the first solve
+        self._networkx = None
+        self._simplex = None
+
+    @property
+    def number_of_edges(self):
+        return len(self.tail)
+
+    def count(self, kind):
+        """Number of edges of the given kind."""
+        return int(np.count_nonzero(self.kind == kind))
+
+    def edges_from(self, node):
+        """Ids of the edges leaving node."""
+        return self.out_edges[self.indptr[node]:self.indptr[node + 1]]
+
+    def edges_to(self, node):
+        """Ids of the edges entering node."""
+        return self.in_edges[self.in_indptr[node]:self.in_indptr[node + 1]]
+
+    def cost(self, objective='fleet'):
+        """
+        Edge costs for an objective.
+
+        Args:
+            objective: 'fleet' (-1 on the garbage edge), 'distance' (empty
+                       distance), 'idle' (idle time between trips),
+                       'lexicographic' (fleet first, then distance; see
+                       fleet_weight()), or a dict of integer weights over
+                       those, e.g. {'fleet': 10000, 'distance': 1}
+        """
+        if objective == 'lexicographic':
+            return self.cost({'fleet': self.fleet_weight(), 'distance': 1})
+        if isinstance(objective, dict):
+            cost = np.zeros(self.number_of_edges, dtype=np.int64)
+            for name, weight in objective.items():
+                cost += weight * self.cost(name).astype(np.int64)
+            return cost
+        if objective == 'distance':
+            return self.distance
+        if objective == 'idle':
+            return self.idle
+        cost = np.zeros(self.number_of_edges, dtype=np.int32)
+        cost[self.kind == GARBAGE_EDGE] = -1
+        return cost
+
+    def fleet_weight(self):
+        """
+        Big-M that makes one taxi cost more than any difference in empty distance.
+
+        Every trip start is entered by one edge and every trip end left by
+        one edge, so a schedule drives at most 2 * n * max(distance) empty;
+        with M one above that, saving a taxi always beats any distance change.
+        """
+        return 2 * self.number_of_trips * int(self.distance.max(initial=0)) + 1
+
+    def supply(self, number_of_trips=None):
+        """Node demands and edge capacities for a parking supply of number_of_trips."""
+        demand, capacity = self.demand, self.capacity
+        if number_of_trips is not None and number_of_trips != -demand[PARKING_START]:
+            demand = demand.copy()
+            demand[PARKING_START], demand[PARKING_END] = -number_of_trips, number_of_trips
+            capacity = capacity.copy()
+            capacity[self.kind == GARBAGE_EDGE] = number_of_trips
+        return demand, capacity
+
+    def subgraph(self, edge_mask, demand=None):
+        """Graph with the same nodes, a subset of the edges and optionally new demands."""
+        reduced = copy.copy(self)
+        if demand is not None:
+            reduced.demand = demand
+        reduced._set_edges(
+            self.tail[edge_mask], self.head[edge_mask], self.kind[edge_mask],
+            self.capacity[edge_mask], self.distance[edge_mask], self.idle[edge_mask],
+        )
+        return reduced
+
+    def to_networkx(self, cost, number_of_trips=None):
+        """
+        NetworkX DiGraph used by nx.network_simplex.
+
+        The DiGraph is built on the first call; later calls update the
+        weights, capacities and parking demands of the same object in place.
+        """
+        demand, capacity = self.supply(number_of_trips)
+        edges = zip(self.tail.tolist(), self.head.tolist(), capacity.tolist(), np.asarray(cost).tolist())
+        G = self._networkx
+        if G is None:
+            G = nx.DiGraph()
+            G.add_nodes_from((node, {'demand': d}) for node, d in enumerate(demand.tolist()))
+            G.add_edges_from(
+                (u, v, {'capacity': c, 'weight': w, 'id': e}) for e, (u, v, c, w) in enumerate(edges)
+            )
+            self._networkx = G
+            return G
+
+        for node in (PARKING_START, PARKING_END):
+            G.nodes[node]['demand'] = int(demand[node])
+        adjacency = G.succ
+        for u, v, c, w in edges:
+            data = adjacency[u][v]
+            data['capacity'] = c
+            data['weight'] = w
+        return G
+
+    def solve(self, cost, number_of_trips=None, solver='networkx', sparse=False):
+        """
+        Min-cost flow of the network for an edge cost vector.
+
+        Args:
+            cost: Edge costs (see cost())
+            number_of_trips: Parking supply (defaults to the graph's)
+            solver: 'networkx' (nx.network_simplex, reference) or 'simplex'
+                    (array-based network simplex, network_simplex.py)
+            sparse: Return only the edges carrying flow (see nonzero_flow)
+
+        Returns:
+            G: NetworkX DiGraph (None with the 'simplex' solver)
+            flowCost: Optimal flow cost
+            flow: Flow on each edge, or an (edges, values) pair of the
+                  nonzero flows when sparse
+        """
+        with tracing.span('solve', solver=solver, nodes=self.number_of_nodes, edges=self.number_of_edges):
+            if solver == 'simplex':
+                demand, capacity = self.supply(number_of_trips)
+                if self._simplex is None:
+                    self._simplex = NetworkSimplex(self.tail, self.head)
+                # Warm-starts from the previous optimal tree when the supply is unchanged
+                flowCost, edges, flows = self._simplex.solve(cost, capacity, demand)
+                tracing.count('solver.simplex_pivots', self._simplex.iterations)
+                if sparse:
+                    used = flows != 0
+                    order = np.argsort(edges[used])
+                    return None, flowCost, (edges[used][order], flows[used][order].astype(np.int32))
+                flow = np.zeros(self.number_of_edges, dtype=np.int32)
+                flow[edges] = flows
+                return None, flowCost, flow
+
+            G = self.to_networkx(cost, number_of_trips)
+            flowCost, flowDict = nx.network_simplex(G)
+            if sparse:
+                return G, flowCost, self.sparse_flow_from_dict(G, flowDict)
+            return G, flowCost, self.flow_from_dict(flowDict)
+
+    def flow_from_dict(self, flowDict):
+        """Convert a NetworkX flowDict into an edge flow array."""
+        return np.fromiter(
+            (flowDict[u][v] for u, v in zip(self.tail.tolist(), self.head.tolist())),
+            dtype=np.int32, count=self.number_of_edges,
+        )
+
+    def sparse_flow_from_dict(self, G, flowDict):
+        """Nonzero flows of a NetworkX flowDict as an (edges, values) pair (see nonzero_flow)."""
+        succ = G.succ
+        pairs = [(succ[u][v]['id'], x) for u, targets in flowDict.items() for v, x in targets.items() if x]
+        edges = np.array([e for e, _ in pairs], dtype=np.int64)
+        values = np.array([x for _, x in pairs], dtype=np.int32)
+        order = np.argsort(edges)
+        return edges[order], values[order]
+
+    @tracing.traced('decode')
+    def successors(self, flow):
+        """Trip served right after every trip (-1 when the taxi returns to the parking)."""
+        successor = np.full(self.number_of_trips, -1, dtype=np.int64)
+        edges, _ = nonzero_flow(flow)
+        used = edges[self.kind[edges] == BACK_EDGE]
+        successor[node_trip(self.tail[used])] = node_trip(self.head[used])
+        return successor
+
+    def used_taxis(self, flow, number_of_trips=None):
+        """Number of taxis leaving the parking in a flow."""
+        if number_of_trips is None:
+            number_of_trips = -int(self.demand[PARKING_START])
+        edges, values = nonzero_flow(flow)
+        return number_of_trips - int(values[self.kind[edges] == GARBAGE_EDGE].sum())
+
+
+def count_network(graph, kind_names=EDGE_KIND_NAMES):
+    """Report the nodes and the edges of every kind of a network to the tracer."""
+    tracing.count('network.nodes', graph.number_of_nodes)
+    for name, number in zip(kind_names, np.bincount(graph.kind, minlength=len(kind_names)).tolist()):
+        tracing.count('network.edges.' + name, number)
+
+
+@tracing.traced('graph_build', network='trip')
+def build_flow_graph(trips, distances, constraint_mode='combined', max_memory=None, compatibility=None):
+    """
+    Build the fleet network for a set of trips.
+
+    The back edges are counted first (CompatibilityIndex.count_edges), then
+    filled into the preallocated edge arrays chunk by chunk as
+    compatible_pairs generates them, so peak memory is the network plus one
+    chunk of the compatibility mask. With precomputed bit matrices, both the
+    count and the pairs come from them instead.
+
+    Args:
+        trips: List of trip data
+        distances: Distance matrix
+        constraint_mode: 'combined', 'end_time', 'start_time', or 'simple'
+        max_memory: Memory ceiling in bytes; MemoryError is raised before
+                    anything is allocated when the network would not fit
+        compatibility: PackedCompatibility supporting constraint_mode (see
+                       compatibility.pack_compatibility), or None
+
+    Returns:
+        graph: FlowGraph
+    """
+    start, end, pickup, dropoff = trips_to_arrays(trips)
+    dense = distance_array(distances)
+    number_of_trips = len(trips)
+    trip_ids = np.arange(number_of_trips, dtype=np.int32)
+
+    if compatibility is not None:
+        number_of_back_edges = compatibility.count_edges(constraint_mode)
+        pairs = compatibility.pairs(constraint_mode)
+    else:
+        number_of_back_edges = CompatibilityIndex(trips, distances, constraint_mode).count_edges()
+        pairs = compatible_pairs(trips, dense, constraint_mode)
+    first_back = 1 + 2 * number_of_trips
+    number_of_edges = first_back + number_of_back_edges
+    check_memory(number_of_edges * EDGE_BYTES,
+                 max_memory, f"The trip network ({number_of_edges} edges, '{constraint_mode}' rule)")
+
+    tail = np.empty(number_of_edges, dtype=np.int32)
+    head = np.empty(number_of_edges, dtype=np.int32)
+    kind = np.empty(number_of_edges, dtype=np.int8)
+    distance = np.empty(number_of_edges, dtype=np.int32)
+    idle = np.zeros(number_of_edges, dtype=np.int32)
+
+    tail[:first_back] = np.concatenate(([PARKING_START], np.full(number_of_trips, PARKING_START), end_node(trip_ids)))
+    head[:first_back] = np.concatenate(([PARKING_END], start_node(trip_ids), np.full(number_of_trips, PARKING_END)))
+    kind[0], kind[1:1 + number_of_trips], kind[1 + number_of_trips:] = GARBAGE_EDGE, START_EDGE, END_EDGE
+    kind[first_back:] = BACK_EDGE
+    distance[:first_back] = np.concatenate(([0], dense[DEPOT, pickup], dense[dropoff, DEPOT]))
+
+    position = first_back
+    for back_tails, back_heads in pairs:
+        chunk = slice(position, position + len(back_tails))
+        tail[chunk] = end_node(back_tails)
+        head[chunk] = start_node(back_heads)
+        distance[chunk] = dense[dropoff[back_tails], pickup[back_heads]]
+        idle[chunk] = start[back_heads] - end[back_tails]
+        position = chunk.stop
+    assert position == number_of_edges, "compatible_pairs and count_edges disagree"
+
+    capacity = np.ones(number_of_edges, dtype=np.int32)
+    capacity[0] = number_of_trips
+
+    demand = np.empty(2 + 2 * number_of_trips, dtype=np.int32)
+    demand[PARKING_START], demand[PARKING_END] = -number_of_trips, number_of_trips
+    demand[2::2] = 1
+    demand[3::2] = -1
+
+    graph = FlowGraph(
+        number_of_trips, pickup.astype(np.int32), dropoff.astype(np.int32),
+        tail, head, kind, capacity, distance, idle, demand,
+    )
+    count_network(graph)
+    return graph
@@ -0,0 +1,200 @@
+"""
+PuLP model of the min-cost flow problem, shared by the ILP scripts.
+
+The model is built straight from the FlowGraph arrays: one integer variable
+per edge with its capacity as upper bound, and one flow-balance constraint
+per node whose terms come from the CSR indexes of the edges entering and
+leaving it (graph.edges_to / graph.edges_from). Every edge is visited
+twice, so construction is linear in the size of the network.
+
+Writing the model to disk is optional: export_model() writes .lp or .mps
+files, gzip-compressed when the name ends in .gz.
+
+The flow-balance matrix is a node-edge incidence matrix, which is totally
+unimodular: with integer demands and capacities every vertex of the LP
+relaxation is integral, so branch-and-bound is not needed.
+solve_flow_relaxation() solves the relaxation with HiGHS (dual simplex,
+which returns a vertex) on a sparse incidence matrix, without any PuLP
+objects, and checks the flow it returns. solve_flow_ilp() only falls back
+to the integer solve (CBC) when that check fails.
+"""
+
+import gzip
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from pulp import (
+    PULP_CBC_CMD, LpAffineExpression, LpConstraint, LpConstraintGE, LpInteger, LpMinimize, LpProblem, LpVariable,
+    value,
+)
+from scipy import sparse
+from scipy.optimize import linprog
+
+import tracing
+from graph import node_name
+
+# Model file formats by extension (before an optional .gz)
+EXPORT_FORMATS = ('.lp', '.mps')
+
+# Largest distance of a relaxation flow value to the nearest integer
+INTEGRALITY_TOLERANCE = 1e-6
+
+
+@tracing.traced('ilp_build')
+def build_flow_problem(graph, cost, number_of_trips, name):
+    """
+    Min-cost flow ILP of a network.
+
+    Args:
+        graph: FlowGraph
+        cost: Edge costs (see FlowGraph.cost)
+        number_of_trips: Parking supply
+        name: Problem name
+
+    Returns:
+        prob: LpProblem, minimizing the flow cost
+        variables: Flow variable of every edge, indexed by edge id
+    """
+    demand, capacity = graph.supply(number_of_trips)
+
+    prob = LpProblem(name, LpMinimize)
+    variables = [
+        LpVariable("X_" + str(arc), 0, upper, LpInteger) for arc, upper in enumerate(capacity.tolist())
+    ]
+    prob.setObjective(LpAffineExpression(
+        (variables[arc], c) for arc, c in enumerate(cost.tolist()) if c != 0
+    ))
+
+    # Flow balance: inflow - outflow >= demand (NetworkX convention), the
+    # amount going into each node is at least the amount leaving it
+    in_edges, in_indptr = graph.in_edges.tolist(), graph.in_indptr.tolist()
+    out_edges, out_indptr = graph.out_edges.tolist(), graph.indptr.tolist()
+    for node, d in enumerate(demand.tolist()):
+        terms = [(variables[arc], 1) for arc in in_edges[in_indptr[node]:in_indptr[node + 1]]]
+        terms += [(variables[arc], -1) for arc in out_edges[out_indptr[node]:out_indptr[node + 1]]]
+        prob.addConstraint(
+            LpConstraint(LpAffineExpression(terms), LpConstraintGE, rhs=d),
+            f"Flow_balance_in_Node_{node_name(node)}",
+        )
+
+    tracing.count('ilp.variables', len(variables))
+    tracing.count('ilp.constraints', len(demand))
+    return prob, variables
+
+
+@tracing.traced('ilp_export')
+def export_model(prob, model_file):
+    """
+    Write a model to disk.
+
+    Args:
+        prob: LpProblem
+        model_file: Output path; the format follows the extension (.lp or
+                    .mps), and a trailing .gz compresses the file
+    """
+    compressed = model_file.endswith('.gz')
+    base, extension = os.path.splitext(model_file[:-3] if compressed else model_file)
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown model format: {model_file} (expected .lp, .mps, .lp.gz or .mps.gz)")
+    directory = os.path.dirname(model_file) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    write = prob.writeMPS if extension == '.mps' else prob.writeLP
+    if not compressed:
+        write(model_file)
+        return
+
+    # PuLP only writes to a path: write next to the target, then compress
+    fd, plain_file = tempfile.mkstemp(suffix=extension, dir=directory)
+    os.close(fd)
+    try:
+        write(plain_file)
+        with open(plain_file, 'rb') as source, gzip.open(model_file, 'wb') as target:
+            shutil.copyfileobj(source, target)
+    finally:
+        os.remove(plain_file)
+
+
+def incidence_matrix(graph):
+    """Node-edge incidence matrix of a network: +1 at the head and -1 at the tail of every edge (CSR)."""
+    edges = np.arange(graph.number_of_edges)
+    return sparse.csr_array(
+        (np.repeat([1.0, -1.0], graph.number_of_edges),
+         (np.concatenate((graph.head, graph.tail)), np.concatenate((edges, edges)))),
+        shape=(graph.number_of_nodes, graph.number_of_edges),
+    )
+
+
+@tracing.traced('relaxation', solver='highs')
+def solve_flow_relaxation(graph, cost, number_of_trips):
+    """
+    LP relaxation of the min-cost flow ILP, with an integrality check.
+
+    The supplies and demands of a network balance, so the flow-balance
+    inequalities of build_flow_problem all hold with equality at any
+    feasible flow; they are passed to HiGHS as equalities, which it solves
+    much faster on these degenerate problems.
+
+    Args:
+        graph: FlowGraph
+        cost: Edge costs (see FlowGraph.cost)
+        number_of_trips: Parking supply
+
+    Returns:
+        flowCost: Optimal objective value (rounded when the flow is integral)
+        flow: Flow on each edge (int32 when integral, float otherwise)
+        integral: Whether every flow value is within INTEGRALITY_TOLERANCE of an integer
+    """
+    demand, capacity = graph.supply(number_of_trips)
+    result = linprog(
+        np.asarray(cost, dtype=np.float64),
+        A_eq=incidence_matrix(graph), b_eq=demand.astype(np.float64),
+        bounds=np.column_stack((np.zeros(graph.number_of_edges), capacity)),
+        method='highs-ds',
+    )
+    if result.status != 0:
+        raise RuntimeError(f"LP relaxation failed: {result.message}")
+
+    flow = result.x
+    fractional = np.count_nonzero(np.abs(flow - np.round(flow)) > INTEGRALITY_TOLERANCE)
+    tracing.count('ilp.fractional_edges', fractional)
+    if fractional:
+        return result.fun, flow, False
+    flow = np.round(flow).astype(np.int32)
+    return int(np.dot(flow, np.asarray(cost, dtype=np.int64))), flow, True
+
+
+def solve_flow_ilp(graph, cost, number_of_trips, name, model_file=None, relaxation=False):
+    """
+    Optimal value of the min-cost flow ILP.
+
+    Args:
+        graph: FlowGraph
+        cost: Edge costs (see FlowGraph.cost)
+        number_of_trips: Parking supply
+        name: Problem name
+        model_file: Where to write the model (see export_model; None to skip)
+        relaxation: Solve the LP relaxation (solve_flow_relaxation) and only
+                    run the integer solve when its flow is not integral
+
+    Returns:
+        flowCost: Optimal objective value
+    """
+    if relaxation:
+        flowCost, _, integral = solve_flow_relaxation(graph, cost, number_of_trips)
+        if not integral:
+            print("LP relaxation is fractional, solving the ILP")
+            relaxation = False
+
+    if not relaxation or model_file is not None:
+        prob, _ = build_flow_problem(graph, cost, number_of_trips, name)
+        if model_file is not None:
+            export_model(prob, model_file)
+
+    if not relaxation:
+        # The problem is solved using PuLP's choice of Solver
+        prob.solve(PULP_CBC_CMD(msg=0))
+        flowCost = int(round(value(prob.objective)))
+    return flowCost
@@ -0,0 +1,175 @@
+"""
+Self-contained problem instance: trips, distances and everything derived.
+
+A ProblemInstance replaces the old module-level state of utils (matrixD,
+trips_converter): it owns the trip columns, the dense distance matrix and
+the indexes built from them (trip durations, compatibility indexes, flow
+networks). Every solve_* function takes the instance explicitly, so two
+instances never share anything and a thread pool or a long-lived process
+can work on many datasets at once. Dropping an instance frees all of it.
+
+Derived indexes are built on first use and cached on the instance. The
+cached networks keep their solver state between solves (see graph.py), so
+a single instance should be solved by one thread at a time.
+"""
+
+import hashlib
+
+import numpy as np
+
+import tracing
+from utils import (
+    get_trip_number,
+    load_distance_matrix,
+    load_trip_table,
+    distance_array,
+    trip_node_names,
+    trips_to_arrays,
+)
+from compatibility import CompatibilityIndex, pack_compatibility
+from graph import build_flow_graph
+from timespace import build_time_space_graph
+
+
+class ProblemInstance:
+    """
+    Trips and distance matrix of one dataset, with lazily derived indexes.
+
+    Attributes:
+        trips: (n, 4) trip table (start_min, end_min, pickup, dropoff)
+        distances: Dense distance matrix (see load_distance_matrix)
+        number_of_trips: Number of trips n
+        start, end, pickup, dropoff: int64 trip columns
+        max_memory: Memory ceiling in bytes of every flow network built (None for none)
+        packed: PackedCompatibility the trip networks are built from (None
+                until compatibility_matrix() is called)
+    """
+
+    __slots__ = ('trips', 'distances', 'number_of_trips', 'start', 'end', 'pickup', 'dropoff',
+                 'max_memory', 'packed', '_trip_time', '_digest', '_indexes', '_graphs')
+
+    def __init__(self, trips, distances, max_memory=None, packed=None):
+        """
+        Args:
+            trips: Trip table (see load_trip_table) or list of trip data
+            distances: Distance matrix (dense array or legacy list of lists)
+            max_memory: Memory ceiling in bytes of every flow network built
+                        (see build_flow_graph)
+            packed: PackedCompatibility of the trips, e.g. computed by another
+                    process (see compatibility_matrix)
+        """
+        self.start, self.end, self.pickup, self.dropoff = trips_to_arrays(trips)
+        self.trips = trips if isinstance(trips, np.ndarray) else np.stack(
+            (self.start, self.end, self.pickup, self.dropoff), axis=1)
+        self.distances = distance_array(distances)
+        self.number_of_trips = len(self.start)
+        self.max_memory = max_memory
+        self.packed = packed
+        self._trip_time = None
+        self._digest = None
+        self._indexes = {}
+        self._graphs = {}
+
+    @classmethod
+    @tracing.traced('load')
+    def from_files(cls, trips_file, distance_file, cache=True, max_memory=None):
+        """
+        Load an instance from a trips file and a distance matrix file.
+
+        Args:
+            trips_file: Path to trips dataset (.txt, .txt.gz or .npy)
+            distance_file: Path to distance matrix
+            cache: Use the .npy distance matrix cache
+            max_memory: Memory ceiling in bytes of every flow network built
+        """
+        return cls(load_trip_table(trips_file), load_distance_matrix(distance_file, cache), max_memory)
+
+    def __repr__(self):
+        return f"ProblemInstance({self.number_of_trips} trips, {len(self.distances) - 1} locations)"
+
+    @property
+    def trip_time(self):
+        """Driving time of every trip, D(pickup, dropoff)."""
+        if self._trip_time is None:
+            self._trip_time = self.distances[self.pickup, self.dropoff]
+        return self._trip_time
+
+    def digest(self):
+        """SHA-256 of the trip table and the distance matrix (hex, cached)."""
+        if self._digest is None:
+            digest = hashlib.sha256()
+            for array in (self.trips, self.distances):
+                array = np.ascontiguousarray(array, dtype=np.int64)
+                digest.update(repr(array.shape).encode())
+                digest.update(array.data)
+            self._digest = digest.hexdigest()
+        return self._digest
+
+    def node_names(self):
+        """Names of the trip start and end nodes (see trip_node_names)."""
+        return trip_node_names(self.number_of_trips)
+
+    def location(self, name):
+        """Location of a trip node name: pickup for trip_<i>_start, dropoff for trip_<i>_end."""
+        trip, side = get_trip_number(name)
+        return int(self.pickup[trip - 1] if side == 'start' else self.dropoff[trip - 1])
+
+    def distance(self, i, j):
+        """Distance from location i to location j."""
+        return int(self.distances[i, j])
+
+    def compatibility(self, constraint_mode='combined'):
+        """CompatibilityIndex of the trips under constraint_mode (cached)."""
+        if constraint_mode not in self._indexes:
+            self._indexes[constraint_mode] = CompatibilityIndex(self.trips, self.distances, constraint_mode)
+        return self._indexes[constraint_mode]
+
+    def compatibility_matrix(self, constraint_modes=('combined',)):
+        """
+        Bit-packed compatibility of several modes, computed in one pass (cached).
+
+        Once computed, the trip networks of these modes are built from the
+        bit matrices instead of evaluating the rule again (see graph()).
+
+        Args:
+            constraint_modes: Modes to support (see compatibility.MODE_PREDICATES)
+
+        Returns:
+            packed: PackedCompatibility
+        """
+        if self.packed is None or not all(self.packed.supports(mode) for mode in constraint_modes):
+            self.packed = pack_compatibility(self.trips, self.distances, constraint_modes, self.max_memory)
+        return self.packed
+
+    def graph(self, network='trip', constraint_mode='combined', cache=None):
+        """
+        Flow network of the trips (cached, one per formulation).
+
+        Args:
+            network: 'trip' or 'time-space' (which always uses the 'simple' rule)
+            constraint_mode: 'combined', 'end_time', 'start_time', or 'simple'
+            cache: SolutionCache to read the network from and store it in
+                   (used only when its graphs option is set)
+
+        Returns:
+            graph: FlowGraph (TimeSpaceGraph for the time-space network)
+        """
+        key = ('time-space', 'simple') if network == 'time-space' else (network, constraint_mode)
+        if key not in self._graphs:
+            graph = None
+            if cache is not None and cache.graphs:
+                graph = cache.load_graph(self, *key)
+            if graph is None:
+                graph = self._build_graph(*key)
+                if cache is not None and cache.graphs:
+                    cache.store_graph(self, *key, graph)
+            self._graphs[key] = graph
+        return self._graphs[key]
+
+    def _build_graph(self, network, constraint_mode):
+        if network == 'time-space':
+            return build_time_space_graph(self.trips, self.distances)
+        if network == 'trip':
+            packed = self.packed if self.packed is not None and self.packed.supports(constraint_mode) else None
+            return build_flow_graph(self.trips, self.distances, constraint_mode, self.max_memory, packed)
+        raise ValueError(f"Unknown network: {network}")
@@ -0,0 +1,204 @@
+"""
+Minimum fleet size by maximum bipartite matching (Hopcroft-Karp).
+
+Phase 1 is a minimum path cover: every back edge used lets one taxi serve
+trip j right after trip i, so the fleet size is the number of trips minus a
+maximum matching between trip ends and trip starts. Hopcroft-Karp finds that
+matching in O(E * sqrt(V)) instead of running the general network simplex.
+"""
+
+from array import array
+
+import numpy as np
+
+import tracing
+from graph import BACK_EDGE, GARBAGE_EDGE, START_EDGE, END_EDGE, node_trip
+
+UNREACHED = np.iinfo(np.int64).max
+
+
+def _edge_positions(indptr, vertices):
+    """Positions of all edges leaving the given left vertices."""
+    begin, end = indptr[vertices], indptr[vertices + 1]
+    counts = end - begin
+    offsets = np.repeat(begin - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(counts.sum())
+
+
+def hopcroft_karp(indptr, heads, number_of_left, number_of_right):
+    """
+    Maximum matching of a bipartite graph in CSR form.
+
+    Each phase layers the graph with a breadth-first search from the free
+    left vertices, keeps only the edges that go one layer deeper (both steps
+    vectorized with NumPy), then augments along vertex-disjoint shortest
+    paths with an iterative depth-first search over those edges.
+
+    Args:
+        indptr: CSR offsets of the left vertices (length number_of_left + 1)
+        heads: Right vertex of every edge
+        number_of_left, number_of_right: Sizes of the two sides
+
+    Returns:
+        mate: For every left vertex, the position in heads of its matched
+              edge, or -1 when unmatched
+        size: Number of matched pairs
+    """
+    indptr = np.asarray(indptr, dtype=np.int64)
+    degree = np.diff(indptr)
+    tails = np.repeat(np.arange(number_of_left), degree)
+    # Within every left vertex, try the right vertices with fewest edges first
+    in_degree = np.bincount(heads, minlength=number_of_right)
+    permutation = np.lexsort((in_degree[heads], tails))
+    heads = np.asarray(heads, dtype=np.int64)[permutation]
+
+    # Greedy initial matching (minimum degree first)
+    heads_list = array('q', heads.tobytes())
+    indptr_list = array('q', indptr.tobytes())
+    mate = [-1] * number_of_left
+    mate_right = [-1] * number_of_right
+    for u in np.argsort(degree, kind='stable').tolist():
+        for position in range(indptr_list[u], indptr_list[u + 1]):
+            v = heads_list[position]
+            if mate_right[v] < 0:
+                mate[u], mate_right[v] = position, u
+                break
+
+    while True:
+        tracing.count('solver.matching_phases')
+        # Breadth-first search: layer the free left vertices and their alternating paths
+        right_mate = np.array(mate_right, dtype=np.int64)
+        dist = np.full(number_of_left, UNREACHED, dtype=np.int64)
+        frontier = np.flatnonzero(np.array(mate) < 0)
+        dist[frontier] = 0
+        limit, depth = -1, 0
+        while len(frontier):
+            reached = right_mate[heads[_edge_positions(indptr, frontier)]]
+            if (reached < 0).any():
+                limit = depth
+                break
+            reached = np.unique(reached)
+            frontier = reached[dist[reached] == UNREACHED]
+            depth += 1
+            dist[frontier] = depth
+        if limit < 0:
+            mate = [int(permutation[position]) if position >= 0 else -1 for position in mate]
+            return mate, sum(1 for position in mate if position >= 0)
+
+        # Edges that go one layer deeper, or reach a free right vertex from the last layer
+        tail_dist = dist[tails]
+        owner = right_mate[heads]
+        layered = np.where(
+            owner >= 0,
+            (tail_dist < limit) & (dist[owner] == tail_dist + 1),
+            tail_dist == limit,
+        )
+        positions = array('q', np.flatnonzero(layered).tobytes())
+        layered_ptr = array('q', np.searchsorted(tails[layered], np.arange(number_of_left + 1)).tobytes())
+        depth_of = dist.tolist()
+
+        # Depth-first search along the layers, one augmenting path per free vertex
+        cursor = list(layered_ptr[:-1])
+        roots = [u for u, position in enumerate(mate) if position < 0 and depth_of[u] == 0]
+        for root in roots:
+            stack = [root]
+            chosen = []
+            while stack:
+                u = stack[-1]
+                if cursor[u] == layered_ptr[u + 1]:
+                    depth_of[u] = UNREACHED
+                    stack.pop()
+                    if chosen:
+                        chosen.pop()
+                    continue
+                position = positions[cursor[u]]
+                cursor[u] += 1
+                w = mate_right[heads_list[position]]
+                if w < 0:
+                    if depth_of[u] != limit:
+                        continue
+                    chosen.append(position)
+                    for x, p in zip(stack, chosen):
+                        mate[x], mate_right[heads_list[p]] = p, x
+                    break
+                if depth_of[w] == depth_of[u] + 1:
+                    stack.append(w)
+                    chosen.append(position)
+
+
+@tracing.traced('solve', solver='matching')
+def minimum_fleet(graph, number_of_trips=None, postsolve=None):
+    """
+    Solve Phase 1 with Hopcroft-Karp.
+
+    Args:
+        graph: FlowGraph (possibly presolved)
+        number_of_trips: Parking supply (defaults to the graph's)
+        postsolve: Postsolve mapping when graph comes from presolve
+
+    Returns:
+        used_taxis: Minimum number of taxis
+        chains: List of taxi chains, each an array of 0-based trip ids
+        flow: Flow on each edge of the (original) graph
+    """
+    if np.any(graph.kind > BACK_EDGE):
+        raise ValueError("The matching solver needs the trip-to-trip network (build_flow_graph)")
+    demand, _ = graph.supply(number_of_trips)
+    number_of_trips = -int(demand[0])
+
+    back = np.flatnonzero(graph.kind == BACK_EDGE)
+    tails = node_trip(graph.tail[back])
+    order = np.argsort(tails, kind='stable')
+    back, tails = back[order], tails[order]
+    heads = node_trip(graph.head[back])
+
+    indptr = np.zeros(graph.number_of_trips + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tails, minlength=graph.number_of_trips), out=indptr[1:])
+    mate, _ = hopcroft_karp(indptr, heads, graph.number_of_trips, graph.number_of_trips)
+
+    flow = np.zeros(graph.number_of_edges, dtype=np.int32)
+    matched = np.array([position for position in mate if position >= 0], dtype=np.int64)
+    flow[back[matched]] = 1
+
+    # Present trip nodes without a matched back edge use their parking edge
+    inflow = np.zeros(graph.number_of_nodes, dtype=np.int32)
+    outflow = np.zeros(graph.number_of_nodes, dtype=np.int32)
+    np.add.at(inflow, graph.head[back[matched]], 1)
+    np.add.at(outflow, graph.tail[back[matched]], 1)
+    start_edges = np.flatnonzero(graph.kind == START_EDGE)
+    end_edges = np.flatnonzero(graph.kind == END_EDGE)
+    flow[start_edges] = (demand[graph.head[start_edges]] - inflow[graph.head[start_edges]]).clip(0)
+    flow[end_edges] = (-demand[graph.tail[end_edges]] - outflow[graph.tail[end_edges]]).clip(0)
+    used_taxis = int(flow[start_edges].sum())
+    flow[graph.kind == GARBAGE_EDGE] = number_of_trips - used_taxis
+
+    if postsolve is not None:
+        _, flow = postsolve.restore(0, flow)
+        graph = postsolve.graph
+    return used_taxis, taxi_chains(graph, flow), flow
+
+
+def taxi_chains(graph, flow):
+    """
+    Decode the taxi chains of a Phase 1/Phase 2 flow.
+
+    Trips linked in a closed loop (possible with the 'combined' rule, where
+    compatibility is not acyclic) form a chain of their own at the end.
+    """
+    successor = graph.successors(flow)
+    has_predecessor = np.zeros(graph.number_of_trips, dtype=bool)
+    has_predecessor[successor[successor >= 0]] = True
+
+    chains = []
+    visited = np.zeros(graph.number_of_trips, dtype=bool)
+    for first in np.flatnonzero(~has_predecessor).tolist() + np.flatnonzero(has_predecessor).tolist():
+        if visited[first]:
+            continue
+        chain = []
+        trip = first
+        while trip >= 0 and not visited[trip]:
+            visited[trip] = True
+            chain.append(trip)
+            trip = successor[trip]
+        chains.append(np.array(chain, dtype=np.int64))
+    return chains
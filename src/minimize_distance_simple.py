@@ -10,79 +10,64 @@ import time
 import matplotlib.pyplot as plt
 import networkx as nx
 
-from utils import (
-    parse_args,
-    file_processing,
-    pre_processing,
-    get_trip_number,
-    get_state_number,
-    set_distance_matrix,
-    get_distance,
-)
-
-
-def solve_minimize_distance(edges, nodes, number_of_trips):
+import tracing
+from utils import parse_args
+from instance import ProblemInstance
+from graph import node_name, start_node, end_node, dense_flow, PARKING_START, PARKING_END
+from presolve import presolve
+from routes import write_routes
+from solution_cache import open_cache, solve_cached
+from timeline import plot_timeline, NETWORK_PLOT_MAX_TRIPS
+
+
+def solve_minimize_distance(instance, graph, postsolve=None, solver='networkx'):
     """
     Solve the minimum empty travel distance problem using network simplex.
 
     Args:
-        edges: Dict containing network edges
-        nodes: List of trip nodes
-        number_of_trips: Total number of trips
+        instance: ProblemInstance of the trips
+        graph: FlowGraph of the instance (or its presolved reduction)
+        postsolve: Postsolve mapping when graph comes from presolve
+        solver: 'networkx' (network simplex) or 'simplex' (array-based network simplex)
 
     Returns:
-        G: NetworkX DiGraph
+        G: NetworkX DiGraph (None with the 'simplex' solver)
         flowCost: Optimal flow cost (total empty distance)
-        flowDict: Flow on each edge
+        flow: Flow on each edge of the graph
     """
-    G = nx.DiGraph()
-
-    #Adding nodes
-    G.add_node('parking_start', demand=-number_of_trips)
-    G.add_node('parking_end', demand=number_of_trips)
-    for node in nodes:
-        if node[-3:] == 'end':
-            G.add_node(node, demand=-1)
-        else:
-            G.add_node(node, demand=1)
-
-    # Adding edges
-    for edge in edges['garbage_edge']:
-        G.add_edge(edge[0], edge[1], capacity=number_of_trips, weight=0)
-    for edge in edges['start_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=get_distance(1, get_state_number(edge[1])))
-    for edge in edges['end_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=get_distance(get_state_number(edge[0]), 1))
-    for edge in edges['back_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=get_distance(get_state_number(edge[0]), get_state_number(edge[1])))
-
+    number_of_trips = instance.number_of_trips
     # Solvve network model
-    flowCost, flowDict = nx.network_simplex(G)
+    G, flowCost, flow = graph.solve(graph.cost('distance'), number_of_trips, solver)
+    if postsolve is not None:
+        flowCost, flow = postsolve.restore(flowCost, flow)
     print('-------------------------')
     print("FlowCost: ", flowCost, "\t |")
     print('-------------------------')
-    print('Used Taxi:', number_of_trips - flowDict['parking_start']['parking_end'], "\t |")
+    print('Used Taxi:', graph.used_taxis(flow, number_of_trips), "\t |")
     # print(flowDict)
-    return G, flowCost, flowDict
+    return G, flowCost, flow
 
 
-def visualize_flow(flowDict, number_of_trips, left_nodes, right_nodes):
+@tracing.traced('plot')
+def visualize_flow(graph, flow, number_of_trips, left_nodes, right_nodes):
     """Create visualization of the flow solution."""
     bipartite_edges = list()
 
     for i in range(len(left_nodes)):
         bipartite_edges.append((left_nodes[i], right_nodes[i]))
 
-    for node in flowDict:
-        for node2 in flowDict[node]:
-            if flowDict[node][node2] != 0:
-                if node == 'parking_start' and node2 == 'parking_end':
-                    continue
-                bipartite_edges.append((node, node2))
+    for u, v, x in zip(graph.tail.tolist(), graph.head.tolist(), flow.tolist()):
+        if x != 0 and (u in (PARKING_START, PARKING_END)) != (v in (PARKING_START, PARKING_END)):
+            bipartite_edges.append((node_name(u), node_name(v)))
+
+    # Trip-to-trip links (decoded from the timelines in the time-space network)
+    for i, j in enumerate(graph.successors(flow).tolist()):
+        if j >= 0:
+            bipartite_edges.append((node_name(end_node(i)), node_name(start_node(j))))
     # print(bipartite_edges)
-    graph = nx.DiGraph()
+    network = nx.DiGraph()
 
-    graph.add_edges_from(bipartite_edges)
+    network.add_edges_from(bipartite_edges)
 
 
     position = {}
@@ -93,30 +78,54 @@ def visualize_flow(flowDict, number_of_trips, left_nodes, right_nodes):
     position.update({'parking_end': (4, number_of_trips/2)})
 
 
-    nx.draw(graph, pos=position, with_labels=True)
+    nx.draw(network, pos=position, with_labels=True)
     plt.show()
 
 
 def main():
-    args = parse_args("Minimize Empty Travel Distance (Simple Constraints)")
-
-    trips, distances, number_of_trips, left_nodes, right_nodes = file_processing(
-        args.trips, args.distance
+    args = parse_args(
+        "Minimize Empty Travel Distance (Simple Constraints)", solvers=('networkx', 'simplex'), networks=('trip', 'time-space'),
+        timeline=True, routes=True, cache=True, presolve=True,
     )
-    set_distance_matrix(distances)
-
-    edges, nodes = pre_processing(trips, constraint_mode='simple')
-
-    start = time.time()
-    G, flowCost, flowDict = solve_minimize_distance(edges, nodes, number_of_trips)
-    end = time.time()
-
-    print('-------------------------')
-    print('Execution Time: ', end - start, 's', "\t |")
-    print('-------------------------')
 
-    if not args.no_plot:
-        visualize_flow(flowDict, number_of_trips, left_nodes, right_nodes)
+    with tracing.session(args):
+        instance = ProblemInstance.from_files(args.trips, args.distance, max_memory=args.max_memory)
+        cache = open_cache(args)
+
+        def solve():
+            graph = instance.graph(args.network, constraint_mode='simple', cache=cache)
+            solve_graph, postsolve = graph, None
+            if args.presolve:
+                solve_graph, postsolve = presolve(graph, objective='distance')
+            _, flowCost, flow = solve_minimize_distance(instance, solve_graph, postsolve, args.solver)
+            used_taxis = graph.used_taxis(flow, instance.number_of_trips)
+            return {'flow_cost': flowCost, 'used_taxis': used_taxis}, graph, flow
+
+        start = time.time()
+        values, routes, flow, cached = solve_cached(
+            cache, instance, args.network, 'simple', 'distance', args.solver, solve, args.presolve)
+        end = time.time()
+        if cached:
+            print('-------------------------')
+            print("FlowCost: ", values['flow_cost'], "\t | (cached)")
+            print('-------------------------')
+            print('Used Taxi:', values['used_taxis'], "\t |")
+
+        print('-------------------------')
+        print('Execution Time: ', end - start, 's', "\t |")
+        print('-------------------------')
+
+        if args.routes:
+            write_routes(instance, routes, args.routes)
+        if args.timeline:
+            graph = instance.graph(args.network, constraint_mode='simple', cache=cache)
+            plot_timeline(instance, routes, args.timeline, graph)
+        if not args.no_plot and instance.number_of_trips <= NETWORK_PLOT_MAX_TRIPS:
+            left_nodes, right_nodes = instance.node_names()
+            graph = instance.graph(args.network, constraint_mode='simple', cache=cache)
+            visualize_flow(graph, dense_flow(flow, graph.number_of_edges), instance.number_of_trips, left_nodes, right_nodes)
+        elif not args.no_plot:
+            print('Network plot skipped for', instance.number_of_trips, 'trips (use --timeline FILE)')
 
 
 if __name__ == "__main__":
@@ -11,75 +11,66 @@ import time
 import matplotlib.pyplot as plt
 import networkx as nx
 
-from utils import (
-    parse_args,
-    file_processing,
-    pre_processing,
-    get_trip_number,
-    set_distance_matrix,
-)
-
-
-def solve_minimize_fleet(edges, nodes, number_of_trips):
+import tracing
+from utils import parse_args
+from instance import ProblemInstance
+from graph import node_name, BACK_EDGE
+from presolve import presolve
+from matching import minimum_fleet
+from routes import write_routes
+from solution_cache import open_cache, solve_cached
+from timeline import plot_timeline, NETWORK_PLOT_MAX_TRIPS
+
+
+def solve_minimize_fleet(instance, graph, postsolve=None, solver='networkx'):
     """
     Solve the minimum fleet size problem using network simplex.
 
     Args:
-        edges: Dict containing network edges
-        nodes: List of trip nodes
-        number_of_trips: Total number of trips
+        instance: ProblemInstance of the trips
+        graph: FlowGraph of the instance (or its presolved reduction)
+        postsolve: Postsolve mapping when graph comes from presolve
+        solver: 'networkx' (network simplex), 'simplex' (array-based network
+                simplex) or 'matching' (Hopcroft-Karp)
 
     Returns:
-        G: NetworkX DiGraph
+        G: NetworkX DiGraph (None unless solver is 'networkx')
         flowCost: Optimal flow cost
-        flowDict: Flow on each edge
+        flow: Flow on each edge of the graph
     """
-    # Defind directed graph
-    G = nx.DiGraph()
-
-    # Adding nodes
-    G.add_node('parking_start', demand=-number_of_trips)
-    G.add_node('parking_end', demand=number_of_trips)
-    for node in nodes:
-        if node[-3:] == 'end':
-            G.add_node(node, demand=-1)
-        else:
-            G.add_node(node, demand=1)
-
-    # Adding edges
-    for edge in edges['garbage_edge']:
-        G.add_edge(edge[0], edge[1], capacity=number_of_trips, weight=-1)
-    for edge in edges['start_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=0)
-    for edge in edges['end_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=0)
-    for edge in edges['back_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=0)
-
-    # Solve network model
-    flowCost, flowDict = nx.network_simplex(G)
+    number_of_trips = instance.number_of_trips
+    if solver == 'matching':
+        G = None
+        used_taxis, chains, flow = minimum_fleet(graph, number_of_trips, postsolve)
+        flowCost = used_taxis - number_of_trips
+    else:
+        # Solve network model
+        G, flowCost, flow = graph.solve(graph.cost('fleet'), number_of_trips, solver)
+        if postsolve is not None:
+            flowCost, flow = postsolve.restore(flowCost, flow)
     # print(flowDict)
     print("FlowCost: ", flowCost)
     print('------------------------------------')
     print('Used Taxi:', number_of_trips + flowCost)
     # print(flowDict)
     # print (flow_cost)
-    return G, flowCost, flowDict
+    return G, flowCost, flow
 
 
-def visualize_network(edges, number_of_trips, left_nodes, right_nodes):
+@tracing.traced('plot')
+def visualize_network(graph, number_of_trips, left_nodes, right_nodes):
     """Create visualization of the network flow graph."""
     # Make complete graph
-    graph = nx.DiGraph()
+    network = nx.DiGraph()
 
-    # edges = {"back_edge": [], "trip_edge": [], "start_edge": [], "end_edge": [], "garbage_edge": []}
     for i in range(number_of_trips):
-        graph.add_edge('trip_' + str(i + 1) + '_start', 'trip_' + str(i + 1) + '_end')
-        graph.add_edge('parking_start', 'trip_' + str(i + 1) + '_start')
-        graph.add_edge('trip_' + str(i + 1) + '_end', 'parking_end')
+        network.add_edge('trip_' + str(i + 1) + '_start', 'trip_' + str(i + 1) + '_end')
+        network.add_edge('parking_start', 'trip_' + str(i + 1) + '_start')
+        network.add_edge('trip_' + str(i + 1) + '_end', 'parking_end')
 
-    for edge in edges['back_edge']:
-        graph.add_edge(edge[0], edge[1])
+    back = graph.kind == BACK_EDGE
+    for u, v in zip(graph.tail[back].tolist(), graph.head[back].tolist()):
+        network.add_edge(node_name(u), node_name(v))
 
     position = {}
     position.update((node, (2, number_of_trips - index)) for index, node in enumerate(left_nodes))
@@ -88,30 +79,52 @@ def visualize_network(edges, number_of_trips, left_nodes, right_nodes):
     position.update({'parking_start': (1, number_of_trips / 2)})
     position.update({'parking_end': (4, number_of_trips / 2)})
 
-    nx.draw(G=graph, pos=position, with_labels=True)
+    nx.draw(G=network, pos=position, with_labels=True)
     plt.show()
 
 
 def main():
-    args = parse_args("Minimize Fleet Size (Network Flow)")
-
-    trips, distances, number_of_trips, left_nodes, right_nodes = file_processing(
-        args.trips, args.distance
+    args = parse_args(
+        "Minimize Fleet Size (Network Flow)", solvers=('networkx', 'simplex', 'matching'), timeline=True, routes=True,
+        cache=True, presolve=True,
     )
-    set_distance_matrix(distances)
-
-    edges, nodes = pre_processing(trips, constraint_mode='combined')
-
-    start = time.time()
-    G, flowCost, flowDict = solve_minimize_fleet(edges, nodes, number_of_trips)
-    end = time.time()
-
-    print('------------------------------------')
-    print('Execution Time: ', end - start, 's')
-    print('------------------------------------')
 
-    if not args.no_plot:
-        visualize_network(edges, number_of_trips, left_nodes, right_nodes)
+    with tracing.session(args):
+        instance = ProblemInstance.from_files(args.trips, args.distance, max_memory=args.max_memory)
+        cache = open_cache(args)
+
+        def solve():
+            graph = instance.graph(constraint_mode='combined', cache=cache)
+            solve_graph, postsolve = graph, None
+            if args.presolve:
+                solve_graph, postsolve = presolve(graph, objective='fleet')
+            _, flowCost, flow = solve_minimize_fleet(instance, solve_graph, postsolve, args.solver)
+            return {'flow_cost': flowCost, 'used_taxis': instance.number_of_trips + flowCost}, graph, flow
+
+        start = time.time()
+        values, routes, _, cached = solve_cached(
+            cache, instance, 'trip', 'combined', 'fleet', args.solver, solve, args.presolve)
+        end = time.time()
+        if cached:
+            print("FlowCost: ", values['flow_cost'], '(cached)')
+            print('------------------------------------')
+            print('Used Taxi:', values['used_taxis'])
+
+        print('------------------------------------')
+        print('Execution Time: ', end - start, 's')
+        print('------------------------------------')
+
+        if args.routes:
+            write_routes(instance, routes, args.routes)
+        if args.timeline:
+            graph = instance.graph(constraint_mode='combined', cache=cache)
+            plot_timeline(instance, routes, args.timeline, graph)
+        if not args.no_plot and instance.number_of_trips <= NETWORK_PLOT_MAX_TRIPS:
+            left_nodes, right_nodes = instance.node_names()
+            graph = instance.graph(constraint_mode='combined', cache=cache)
+            visualize_network(graph, instance.number_of_trips, left_nodes, right_nodes)
+        elif not args.no_plot:
+            print('Network plot skipped for', instance.number_of_trips, 'trips (use --timeline FILE)')
 
 
 if __name__ == "__main__":
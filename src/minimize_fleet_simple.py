@@ -7,53 +7,38 @@ only checks if driver can reach the next pickup before its start time.
 
 import time
 
-import networkx as nx
+import tracing
+from utils import parse_args
+from instance import ProblemInstance
+from presolve import presolve
+from matching import minimum_fleet
 
-from utils import (
-    parse_args,
-    file_processing,
-    pre_processing,
-    set_distance_matrix,
-)
 
-
-def solve_minimize_fleet(edges, nodes, number_of_trips):
+def solve_minimize_fleet(instance, graph, postsolve=None, solver='networkx'):
     """
     Solve the minimum fleet size problem using network simplex.
 
     Args:
-        edges: Dict containing network edges
-        nodes: List of trip nodes
-        number_of_trips: Total number of trips
+        instance: ProblemInstance of the trips
+        graph: FlowGraph of the instance (or its presolved reduction)
+        postsolve: Postsolve mapping when graph comes from presolve
+        solver: 'networkx' (network simplex), 'simplex' (array-based network
+                simplex) or 'matching' (Hopcroft-Karp)
 
     Returns:
-        G: NetworkX DiGraph
+        G: NetworkX DiGraph (None unless solver is 'networkx')
         flowCost: Optimal flow cost
     """
-    # Defind directed graph
-    G = nx.DiGraph()
-
-    #Adding nodes
-    G.add_node('parking_start', demand=-number_of_trips)
-    G.add_node('parking_end', demand=number_of_trips)
-    for node in nodes:
-        if node[-3:] == 'end':
-            G.add_node(node, demand=-1)
-        else:
-            G.add_node(node, demand=1)
-
-    # Adding edges
-    for edge in edges['garbage_edge']:
-        G.add_edge(edge[0], edge[1], capacity=number_of_trips, weight=-1)
-    for edge in edges['start_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=0)
-    for edge in edges['end_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=0)
-    for edge in edges['back_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=0)
-
-    # Solvve network model
-    flowCost, flowDict = nx.network_simplex(G)
+    number_of_trips = instance.number_of_trips
+    if solver == 'matching':
+        G = None
+        used_taxis, chains, flow = minimum_fleet(graph, number_of_trips, postsolve)
+        flowCost = used_taxis - number_of_trips
+    else:
+        # Solvve network model
+        G, flowCost, flow = graph.solve(graph.cost('fleet'), number_of_trips, solver)
+        if postsolve is not None:
+            flowCost, _ = postsolve.restore(flowCost, flow)
     # print(flowDict)
     print("FlowCost: ", flowCost)
     print('------------------------------------')
@@ -64,22 +49,26 @@ def solve_minimize_fleet(edges, nodes, number_of_trips):
 
 
 def main():
-    args = parse_args("Minimize Fleet Size (Simple Constraints)")
-
-    trips, distances, number_of_trips, left_nodes, right_nodes = file_processing(
-        args.trips, args.distance
+    args = parse_args(
+        "Minimize Fleet Size (Simple Constraints)", solvers=('networkx', 'simplex', 'matching'), networks=('trip', 'time-space'),
+        presolve=True,
     )
-    set_distance_matrix(distances)
 
-    edges, nodes = pre_processing(trips, constraint_mode='simple')
+    with tracing.session(args):
+        instance = ProblemInstance.from_files(args.trips, args.distance, max_memory=args.max_memory)
 
-    start = time.time()
-    G, flowCost = solve_minimize_fleet(edges, nodes, number_of_trips)
-    end = time.time()
+        graph = instance.graph(args.network, constraint_mode='simple')
+        postsolve = None
+        if args.presolve:
+            graph, postsolve = presolve(graph, objective='fleet')
 
-    print('------------------------------------')
-    print('Execution Time: ', end - start, 's')
-    print('------------------------------------')
+        start = time.time()
+        G, flowCost = solve_minimize_fleet(instance, graph, postsolve, args.solver)
+        end = time.time()
+
+        print('------------------------------------')
+        print('Execution Time: ', end - start, 's')
+        print('------------------------------------')
 
 
 if __name__ == "__main__":
@@ -4,145 +4,283 @@ Bi-objective Optimization: Fleet Size vs Empty Travel Distance.
 This module performs multi-objective optimization comparing three different
 trip compatibility constraint formulations and evaluates the trade-off between
 minimizing fleet size and minimizing empty travel distance.
+
+The 3 Phase 1 solves and the Phase 2 grid are independent; with --workers N
+they run in a process pool. Workers read the trip columns and the distance
+matrix from shared memory into their own ProblemInstance, results are collected
+in grid order, and --timeout bounds every single solve.
+
+The compatibility rule of the three formulations is evaluated once, as
+bit-packed 'end_time' and 'start_time' matrices ('combined' is their OR,
+see compatibility.PackedCompatibility); the workers share them too, and
+each network is only built from them when a solve needs it.
+
+Hopcroft-Karp only minimizes the fleet: with --solver matching, Phase 2
+runs on NetworkX's network simplex instead (see phase2_solver), and the run
+says so.
+
+--frontier replaces the grid with the exact Pareto frontier of every
+formulation (frontier.py), exported to results/pareto_frontier.json.
 """
 
-import time
+import json
+import multiprocessing
+import os
+import signal
+from datetime import datetime
+from multiprocessing import shared_memory
 
 import networkx as nx
+import numpy as np
 
-from utils import (
-    parse_args,
-    file_processing,
-    pre_processing,
-    get_state_number,
-    set_distance_matrix,
-    get_distance,
-    calculate_mean_trip_time,
-)
+import tracing
+from utils import parse_args, calculate_mean_trip_time
+from instance import ProblemInstance
+from compatibility import PackedCompatibility
+from matching import minimum_fleet
+from frontier import pareto_frontier
+from network_simplex import InfeasibleError
 
 
-def solve_phase1(edges, nodes, number_of_trips):
+def solve_phase1(instance, graph, solver='networkx'):
     """
     Solve Phase 1: Minimize fleet size.
 
+    Args:
+        instance: ProblemInstance of the trips
+        graph: FlowGraph of the instance
+        solver: 'networkx' (network simplex), 'simplex' (array-based network
+                simplex) or 'matching' (Hopcroft-Karp)
+
     Returns:
-        G: NetworkX DiGraph
+        G: NetworkX DiGraph (None unless solver is 'networkx')
         flowCost: Optimal flow cost
-        flowDict: Flow on each edge
+        flow: Flow on each edge of the graph
     """
-    # Defind directed graph
-    G = nx.DiGraph()
-
-    #Adding nodes
-    G.add_node('parking_start', demand=-number_of_trips)
-    G.add_node('parking_end', demand=number_of_trips)
-    for node in nodes:
-        if node[-3:] == 'end':
-            G.add_node(node, demand=-1)
-        else:
-            G.add_node(node, demand=1)
-
-    # Adding edges
-    for edge in edges['garbage_edge']:
-        G.add_edge(edge[0], edge[1], capacity=number_of_trips, weight=-1)
-    for edge in edges['start_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=0)
-    for edge in edges['end_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=0)
-    for edge in edges['back_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=0)
+    number_of_trips = instance.number_of_trips
+    if solver == 'matching':
+        used_taxis, chains, flow = minimum_fleet(graph, number_of_trips)
+        return None, used_taxis - number_of_trips, flow
 
     # Solve network model
-    flowCost, flowDict = nx.network_simplex(G)
-    return G, flowCost, flowDict
+    return graph.solve(graph.cost('fleet'), number_of_trips, solver)
 
 
-def solve_phase2(edges, nodes, number_of_trips):
+def phase2_solver(solver):
+    """Solver of the Phase 2 solves: 'matching' cannot minimize distance, so it falls back to 'networkx'."""
+    return 'networkx' if solver == 'matching' else solver
+
+
+def solve_phase2(instance, graph, fleet_size=None, solver='networkx'):
     """
     Solve Phase 2: Minimize empty travel distance.
 
+    Args:
+        instance: ProblemInstance of the trips
+        graph: FlowGraph of the instance
+        fleet_size: Taxis available at the parking (defaults to one per trip)
+        solver: 'networkx' (network simplex) or 'simplex' (array-based network
+                simplex); never 'matching' (see phase2_solver)
+
     Returns:
-        G: NetworkX DiGraph
+        G: NetworkX DiGraph (None with the 'simplex' solver)
         flowCost: Optimal flow cost (total empty distance)
-        flowDict: Flow on each edge
+        flow: Flow on each edge of the graph
+    """
+    if fleet_size is None:
+        fleet_size = instance.number_of_trips
+    # Solvve network model
+    return graph.solve(graph.cost('distance'), fleet_size, solver)
+
+
+class SolveTimeout(Exception):
+    """A solve exceeded its time limit."""
+
+
+# Per-process state: the instance over the shared trip/distance arrays
+_shared = {}
+
+
+def _share(array):
+    """Copy array into a new shared memory block; returns (block, descriptor)."""
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def _init_worker(trips_descriptor, distance_descriptor, packed_descriptors, solver, max_memory):
+    """Attach a worker process to the shared trip, distance and compatibility arrays (no copy)."""
+    blocks = []
+    arrays = []
+    for name, shape, dtype in (trips_descriptor, distance_descriptor, *packed_descriptors.values()):
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=block.buf))
+    trips, distances, *bits = arrays
+    packed = PackedCompatibility(len(trips), dict(zip(packed_descriptors, bits)))
+    _shared.update(blocks=blocks, instance=ProblemInstance(trips, distances, max_memory, packed), solver=solver)
+
+
+def _raise_timeout(signum, frame):
+    raise SolveTimeout()
+
+
+def _solve_task(task):
+    """
+    Run one solve of the grid in the current process.
+
+    Args:
+        task: (phase, mode, supply, timeout); phase is 1, 2 or 'frontier',
+              supply is the parking supply (number of trips in Phase 1 and
+              for the frontier, fleet size in Phase 2)
+
+    Returns:
+        status: 'optimal', 'infeasible' or 'timeout'
+        flowCost: Optimal flow cost, or the list of Pareto points for the
+                  frontier (None unless optimal)
     """
-    G = nx.DiGraph()
-
-    #Adding nodes
-    G.add_node('parking_start', demand=-number_of_trips)
-    G.add_node('parking_end', demand=number_of_trips)
-    for node in nodes:
-        if node[-3:] == 'end':
-            G.add_node(node, demand=-1)
+    phase, mode, supply, timeout = task
+    instance = _shared['instance']
+    graph = instance.graph(constraint_mode=mode)
+
+    use_alarm = timeout is not None and hasattr(signal, 'setitimer')
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        if phase == 'frontier':
+            return 'optimal', pareto_frontier(graph, supply)
+        if phase == 1:
+            G, flowCost, flow = solve_phase1(instance, graph, _shared['solver'])
         else:
-            G.add_node(node, demand=1)
-
-    # Adding edges
-    for edge in edges['garbage_edge']:
-        G.add_edge(edge[0], edge[1], capacity=number_of_trips, weight=0)
-    for edge in edges['start_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=get_distance(1, get_state_number(edge[1])))
-    for edge in edges['end_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=get_distance(get_state_number(edge[0]), 1))
-    for edge in edges['back_edge']:
-        G.add_edge(edge[0], edge[1], capacity=1, weight=get_distance(get_state_number(edge[0]), get_state_number(edge[1])))
+            G, flowCost, flow = solve_phase2(instance, graph, supply, phase2_solver(_shared['solver']))
+        return 'optimal', flowCost
+    except (nx.NetworkXUnfeasible, InfeasibleError):
+        return 'infeasible', None
+    except SolveTimeout:
+        return 'timeout', None
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
 
-    # Solvve network model
-    flowCost, flowDict = nx.network_simplex(G)
-    return G, flowCost, flowDict
 
+def run_grid(tasks, pool=None):
+    """Run solve tasks in the pool (or in this process), results in task order."""
+    if pool is None:
+        return [_solve_task(task) for task in tasks]
+    return pool.map(_solve_task, tasks, chunksize=1)
+
+
+def save_frontiers(trips_file, constraint_modes, frontiers, results_file="results/pareto_frontier.json"):
+    """Print the Pareto frontier of every formulation and export them as JSON."""
+    print("\n=== Pareto Frontier: (Used Taxis, Empty Distance) ===")
+    exported = {}
+    for mode, (status, points) in zip(constraint_modes, frontiers):
+        if status != 'optimal':
+            print(f"  {mode}: {status}")
+            continue
+        print(f"  {mode}: " + ", ".join(f"({taxis}, {distance})" for taxis, distance in points))
+        exported[mode] = [{'taxis': taxis, 'empty_distance': distance} for taxis, distance in points]
+
+    os.makedirs(os.path.dirname(results_file), exist_ok=True)
+    with open(results_file, 'w') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(),
+            'trips': trips_file,
+            'frontiers': exported,
+        }, f, indent=2)
+    print(f"\nFrontier saved to {results_file}")
 
-def main():
-    args = parse_args("Bi-objective Optimization")
 
-    trips, distances, number_of_trips, left_nodes, right_nodes = file_processing(
-        args.trips, args.distance
+def main():
+    args = parse_args(
+        "Bi-objective Optimization", solvers=('networkx', 'simplex', 'matching'), parallel=True, frontier=True,
+        solver_help="Solver backend ('matching' only solves Phase 1; Phase 2 then uses networkx)",
     )
-    set_distance_matrix(distances)
-
-    trips_mean_time = calculate_mean_trip_time(trips)
-    print("Mean trip time:", trips_mean_time)
-
-    # Test three different constraint formulations
-    constraint_modes = ['combined', 'end_time', 'start_time']
-    all_edges = []
-
-    for mode in constraint_modes:
-        edges, nodes = pre_processing(trips, constraint_mode=mode)
-        all_edges.append([edges, nodes, mode])
-
-    # Phase 1: Find minimum fleet sizes for each formulation
-    print("\n=== Phase 1: Minimum Fleet Size ===")
-    all_flows_from_phase1 = []
-    for edges, nodes, mode in all_edges:
-        G, flowCost, flowDict = solve_phase1(edges, nodes, number_of_trips)
-        min_taxis = number_of_trips + flowCost
-        all_flows_from_phase1.append(min_taxis)
-        print(f"  {mode}: {min_taxis} taxis")
-
-    # Phase 2: Find minimum distance for each fleet size / formulation combination
-    print("\n=== Phase 2: Minimum Empty Distance ===")
-    pre_costs = []
-    for flowcost in all_flows_from_phase1:
-        for edges, nodes, mode in all_edges:
-            try:
-                G, flow_cost, flow_dict = solve_phase2(edges, nodes, flowcost)
+
+    with tracing.session(args):
+        instance = ProblemInstance.from_files(args.trips, args.distance, max_memory=args.max_memory)
+        number_of_trips = instance.number_of_trips
+
+        trips_mean_time = calculate_mean_trip_time(instance.trips)
+        print("Mean trip time:", trips_mean_time)
+
+        # Test three different constraint formulations
+        constraint_modes = ['combined', 'end_time', 'start_time']
+        # One pass over the trip pairs for all three
+        packed = instance.compatibility_matrix(constraint_modes)
+
+        # Trip table and dense distances, shared with the workers
+        blocks = []
+        pool = None
+        if args.workers > 1:
+            trips_block, trips_descriptor = _share(np.asarray(instance.trips))
+            distance_block, distance_descriptor = _share(np.asarray(instance.distances))
+            blocks = [trips_block, distance_block]
+            packed_descriptors = {}
+            for predicate, matrix in packed.bits.items():
+                block, packed_descriptors[predicate] = _share(matrix)
+                blocks.append(block)
+            pool = multiprocessing.Pool(
+                args.workers, initializer=_init_worker,
+                initargs=(trips_descriptor, distance_descriptor, packed_descriptors, args.solver, args.max_memory),
+            )
+        else:
+            _shared.update(instance=instance, solver=args.solver)
+
+        try:
+            if args.frontier:
+                tasks = [('frontier', mode, number_of_trips, args.timeout) for mode in constraint_modes]
+                frontiers = run_grid(tasks, pool)
+                save_frontiers(args.trips, constraint_modes, frontiers)
+                return
+
+            # Phase 1: Find minimum fleet sizes for each formulation
+            print("\n=== Phase 1: Minimum Fleet Size ===")
+            tasks = [(1, mode, number_of_trips, args.timeout) for mode in constraint_modes]
+            all_flows_from_phase1 = []
+            for mode, (status, flowCost) in zip(constraint_modes, run_grid(tasks, pool)):
+                if status != 'optimal':
+                    print(f"  {mode}: {status}")
+                    continue
+                min_taxis = number_of_trips + flowCost
+                all_flows_from_phase1.append(min_taxis)
+                print(f"  {mode}: {min_taxis} taxis")
+
+            # Phase 2: Find minimum distance for each fleet size / formulation combination
+            print("\n=== Phase 2: Minimum Empty Distance ===")
+            if phase2_solver(args.solver) != args.solver:
+                print(f"  (the {args.solver} solver cannot minimize distance; using {phase2_solver(args.solver)})")
+            tasks = [
+                (2, mode, flowcost, args.timeout)
+                for flowcost in all_flows_from_phase1 for mode in constraint_modes
+            ]
+            pre_costs = []
+            for (_, mode, flowcost, _), (status, flow_cost) in zip(tasks, run_grid(tasks, pool)):
+                if status != 'optimal':
+                    print(f"  Fleet={flowcost}, {mode}: {status}")
+                    continue
                 print(f"  Fleet={flowcost}, {mode}: distance={flow_cost}")
-            except:
-                print(f"  Fleet={flowcost}, {mode}: infeasible")
-                flow_cost = 10000000
-            pre_costs.append((flowcost, flow_cost))
-
-    # Calculate efficiency metrics
-    print("\n=== Efficiency Analysis ===")
-    costs = dict()
-    for (used_taxi, waste_time) in pre_costs:
-        efficiency = int((used_taxi * trips_mean_time) - (waste_time / number_of_trips))
-        costs[(used_taxi, waste_time)] = efficiency
-
-    print("(Used Taxis, Empty Distance) -> Efficiency Score")
-    for key, value in sorted(costs.items(), key=lambda x: x[1], reverse=True):
-        print(f"  {key} -> {value}")
+                pre_costs.append((flowcost, flow_cost))
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        # Calculate efficiency metrics
+        print("\n=== Efficiency Analysis ===")
+        costs = dict()
+        for (used_taxi, waste_time) in pre_costs:
+            efficiency = int((used_taxi * trips_mean_time) - (waste_time / number_of_trips))
+            costs[(used_taxi, waste_time)] = efficiency
+
+        print("(Used Taxis, Empty Distance) -> Efficiency Score")
+        for key, value in sorted(costs.items(), key=lambda x: x[1], reverse=True):
+            print(f"  {key} -> {value}")
 
 
 if __name__ == "__main__":
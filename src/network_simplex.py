@@ -0,0 +1,383 @@
+"""
+Array-based primal network simplex for min-cost flow.
+
+The solver works directly on the integer edge arrays of a FlowGraph
+(tail, head, capacity, cost) and node demands, without building a NetworkX
+graph. It follows the classic spanning tree implementation (as in LEMON):
+
+- an artificial root with one artificial edge per node gives the initial
+  strongly feasible tree;
+- the tree is stored as parent / predecessor edge / thread lists, so the
+  cycle of an entering edge and the subtree to re-price are found by
+  walking the tree;
+- entering edges are chosen by block search: edges are scanned in blocks of
+  about sqrt(E), and the most negative reduced cost of the first block
+  that has one enters. Reduced costs of a block are computed with NumPy.
+
+Demands use the NetworkX convention (negative demand = supply), so results
+match nx.network_simplex on the same network. A NetworkSimplex object can be
+solved repeatedly with new costs, warm-starting from its last optimal tree.
+"""
+
+import math
+
+import numpy as np
+
+# Edge states (the sign makes state * reduced_cost < 0 mean "improving")
+STATE_UPPER = -1
+STATE_TREE = 0
+STATE_LOWER = 1
+
+# Direction of the predecessor edge of a tree node
+DIR_UP = 1     # edge goes from the node to its parent
+DIR_DOWN = -1  # edge goes from the parent to the node
+
+MIN_BLOCK_SIZE = 10
+
+
+class InfeasibleError(ValueError):
+    """No flow satisfies the node demands (nx.NetworkXUnfeasible for NetworkSimplex)."""
+
+
+class NetworkSimplex:
+    """
+    Reusable min-cost flow solver over fixed edge arrays.
+
+    The edge arrays are converted once; solve() then accepts any cost vector,
+    capacities and demands. When the capacities and demands are the same as
+    in the previous solve, the optimal spanning tree of that solve is kept as
+    the starting basis (it is primal feasible for any costs), so re-weighting
+    the network only re-prices the tree and pivots from there.
+    """
+
+    def __init__(self, tail, head):
+        self.tail = np.asarray(tail, dtype=np.int64)
+        self.head = np.asarray(head, dtype=np.int64)
+        self.number_of_edges = len(self.tail)
+        self.block_size = max(int(math.sqrt(self.number_of_edges)), MIN_BLOCK_SIZE)
+        self._capacity = None
+        self._demand = None
+        self._tree = None
+        self.potential = None
+        self.iterations = 0
+
+    def solve(self, cost, capacity, demand):
+        """
+        Solve a min-cost flow problem with finite capacities.
+
+        Args:
+            cost: Edge costs (integers)
+            capacity: Edge capacities (finite, non-negative)
+            demand: Node demands, NetworkX convention (must sum to zero)
+
+        Returns:
+            flowCost: Cost of an optimal flow
+            edges: Ids of the edges with nonzero flow (increasing)
+            flows: Flow on those edges
+
+        Raises:
+            InfeasibleError: If the demands are not balanced or no feasible flow exists
+        """
+        capacity = np.asarray(capacity, dtype=np.int64)
+        demand = np.asarray(demand, dtype=np.int64)
+        if demand.sum() != 0:
+            raise InfeasibleError("Total node demand is not zero")
+        warm = (
+            self._tree is not None
+            and np.array_equal(capacity, self._capacity) and np.array_equal(demand, self._demand)
+        )
+        if not warm:
+            self._capacity, self._demand = capacity, demand
+            self._initial_tree(capacity, demand)
+
+        number_of_nodes = len(demand)
+        number_of_edges = self.number_of_edges
+        cost = np.asarray(cost, dtype=np.int64)
+        art_cost = (int(np.abs(cost).max(initial=0)) + 1) * (number_of_nodes + 1)
+        edge_cost = np.concatenate((cost, np.where(self._positive, 0, art_cost)))
+        cost_list = edge_cost.tolist()
+
+        tree = self._tree
+        self._tree = None  # only reused once this solve completes
+        source, target = tree['source'], tree['target']
+        source_list, target_list = tree['source_list'], tree['target_list']
+        state, cap, flow = tree['state'], tree['cap'], tree['flow']
+        parent, pred, pred_dir = tree['parent'], tree['pred'], tree['pred_dir']
+        thread, rev_thread = tree['thread'], tree['rev_thread']
+        succ_num, last_succ = tree['succ_num'], tree['last_succ']
+
+        # Node potentials making every tree edge's reduced cost zero
+        root = number_of_nodes
+        potential = [0] * (number_of_nodes + 1)
+        u = thread[root]
+        while u != root:
+            e = pred[u]
+            potential[u] = potential[parent[u]] + (-cost_list[e] if pred_dir[u] == DIR_UP else cost_list[e])
+            u = thread[u]
+        pi = np.array(potential, dtype=np.int64)
+
+        block_size = self.block_size
+        next_edge = 0
+        pivots = 0
+
+        while number_of_edges:
+            # Block search for the entering edge
+            in_edge = -1
+            scanned = 0
+            while scanned < number_of_edges:
+                begin = next_edge
+                end = min(begin + block_size, number_of_edges)
+                reduced = state[begin:end] * (edge_cost[begin:end] + pi[source[begin:end]] - pi[target[begin:end]])
+                best = int(reduced.argmin())
+                scanned += end - begin
+                next_edge = end if end < number_of_edges else 0
+                if reduced[best] < 0:
+                    in_edge = begin + best
+                    break
+            if in_edge < 0:
+                break
+            pivots += 1
+
+            # Join node: where the paths from both endpoints to the root meet
+            u, v = source_list[in_edge], target_list[in_edge]
+            while u != v:
+                if succ_num[u] < succ_num[v]:
+                    u = parent[u]
+                else:
+                    v = parent[v]
+            join = u
+
+            # Leaving edge: first blocking edge of the cycle (strongly feasible tie rule)
+            if state[in_edge] == STATE_LOWER:
+                first, second = source_list[in_edge], target_list[in_edge]
+            else:
+                first, second = target_list[in_edge], source_list[in_edge]
+            delta = cap[in_edge]
+            result = 0
+            u_out = -1
+            u = first
+            while u != join:
+                e = pred[u]
+                d = flow[e] if pred_dir[u] == DIR_UP else cap[e] - flow[e]
+                if d < delta:
+                    delta, u_out, result = d, u, 1
+                u = parent[u]
+            u = second
+            while u != join:
+                e = pred[u]
+                d = flow[e] if pred_dir[u] == DIR_DOWN else cap[e] - flow[e]
+                if d <= delta:
+                    delta, u_out, result = d, u, 2
+                u = parent[u]
+            if result == 1:
+                u_in, v_in = first, second
+            else:
+                u_in, v_in = second, first
+
+            # Augment along the cycle
+            if delta > 0:
+                value = int(state[in_edge]) * delta
+                flow[in_edge] += value
+                u = source_list[in_edge]
+                while u != join:
+                    flow[pred[u]] -= pred_dir[u] * value
+                    u = parent[u]
+                u = target_list[in_edge]
+                while u != join:
+                    flow[pred[u]] += pred_dir[u] * value
+                    u = parent[u]
+
+            if result == 0:
+                # The entering edge itself blocks: it moves to its other bound
+                state[in_edge] = -state[in_edge]
+                continue
+            state[in_edge] = STATE_TREE
+            state[pred[u_out]] = STATE_LOWER if flow[pred[u_out]] == 0 else STATE_UPPER
+
+            _update_tree(
+                in_edge, join, u_in, v_in, u_out, source_list,
+                parent, pred, pred_dir, thread, rev_thread, succ_num, last_succ,
+            )
+
+            # Re-price the subtree now hanging from u_in
+            sigma = int(pi[v_in] - pi[u_in]) - (cost_list[in_edge] if pred_dir[u_in] == DIR_UP else -cost_list[in_edge])
+            subtree = []
+            stop = thread[last_succ[u_in]]
+            u = u_in
+            while u != stop:
+                subtree.append(u)
+                u = thread[u]
+            pi[subtree] += sigma
+
+        self.iterations = pivots
+        if any(flow[number_of_edges:]):
+            raise InfeasibleError("No flow satisfies all node demands")
+        self._tree = tree
+        # Optimal duals: cost + potential[tail] - potential[head] is >= 0 on
+        # edges below capacity and <= 0 on edges carrying flow
+        self.potential = pi[:number_of_nodes].copy()
+
+        flow = np.array(flow[:number_of_edges], dtype=np.int64)
+        edges = np.flatnonzero(flow)
+        flowCost = int(np.dot(flow[edges], edge_cost[edges]))
+        return flowCost, edges, flow[edges]
+
+    def _initial_tree(self, capacity, demand):
+        """Spanning tree of artificial edges: every node hangs from an artificial root."""
+        number_of_nodes = len(demand)
+        number_of_edges = self.number_of_edges
+        root = number_of_nodes
+        supply = -demand
+        nodes = np.arange(number_of_nodes, dtype=np.int64)
+        self._positive = positive = supply >= 0
+
+        # Real edges followed by one artificial edge per node (to or from the root)
+        source = np.concatenate((self.tail, np.where(positive, nodes, root)))
+        target = np.concatenate((self.head, np.where(positive, root, nodes)))
+        # Artificial edges are uncapacitated: nothing can block them
+        unbounded = int(capacity.sum()) + int(supply[positive].sum()) + 1
+
+        self._tree = {
+            'source': source,
+            'target': target,
+            'source_list': source.tolist(),
+            'target_list': target.tolist(),
+            'state': np.concatenate((
+                np.full(number_of_edges, STATE_LOWER, dtype=np.int64),
+                np.full(number_of_nodes, STATE_TREE, dtype=np.int64),
+            )),
+            'cap': capacity.tolist() + [unbounded] * number_of_nodes,
+            'flow': [0] * number_of_edges + np.abs(supply).tolist(),
+            'parent': [root] * number_of_nodes + [-1],
+            'pred': list(range(number_of_edges, number_of_edges + number_of_nodes)) + [-1],
+            'pred_dir': np.where(positive, DIR_UP, DIR_DOWN).tolist() + [0],
+            'thread': list(range(1, number_of_nodes + 1)) + [0],
+            'rev_thread': [root] + list(range(number_of_nodes)),
+            'succ_num': [1] * number_of_nodes + [number_of_nodes + 1],
+            'last_succ': list(range(number_of_nodes)) + [root - 1 if number_of_nodes else root],
+        }
+
+
+def network_simplex(tail, head, capacity, cost, demand):
+    """
+    Solve a min-cost flow problem with finite capacities (one-off NetworkSimplex).
+
+    Args:
+        tail, head: Edge endpoints (node ids 0..len(demand)-1)
+        capacity: Edge capacities (finite, non-negative)
+        cost: Edge costs (integers)
+        demand: Node demands, NetworkX convention (must sum to zero)
+
+    Returns:
+        flowCost: Cost of an optimal flow
+        edges: Ids of the edges with nonzero flow (increasing)
+        flows: Flow on those edges
+    """
+    return NetworkSimplex(tail, head).solve(cost, capacity, demand)
+
+
+def _update_tree(in_edge, join, u_in, v_in, u_out, source,
+                 parent, pred, pred_dir, thread, rev_thread, succ_num, last_succ):
+    """Replace the leaving edge (above u_out) by in_edge in the spanning tree."""
+    old_rev_thread = rev_thread[u_out]
+    old_succ_num = succ_num[u_out]
+    old_last_succ = last_succ[u_out]
+    v_out = parent[u_out]
+
+    if u_in == u_out:
+        parent[u_in] = v_in
+        pred[u_in] = in_edge
+        pred_dir[u_in] = DIR_UP if u_in == source[in_edge] else DIR_DOWN
+
+        # Move the subtree of u_in right after v_in in the thread
+        if thread[v_in] != u_out:
+            after = thread[old_last_succ]
+            thread[old_rev_thread] = after
+            rev_thread[after] = old_rev_thread
+            after = thread[v_in]
+            thread[v_in] = u_out
+            rev_thread[u_out] = v_in
+            thread[old_last_succ] = after
+            rev_thread[after] = old_last_succ
+    else:
+        thread_continue = thread[old_last_succ] if old_rev_thread == v_in else thread[v_in]
+
+        # Reverse the stem u_in -> u_out, moving each subtree into the new thread order
+        stem = u_in
+        par_stem = v_in
+        last = last_succ[u_in]
+        after = thread[last]
+        thread[v_in] = u_in
+        dirty_revs = [v_in]
+        while stem != u_out:
+            next_stem = parent[stem]
+            thread[last] = next_stem
+            dirty_revs.append(last)
+
+            before = rev_thread[stem]
+            thread[before] = after
+            rev_thread[after] = before
+
+            parent[stem] = par_stem
+            par_stem = stem
+            stem = next_stem
+
+            last = rev_thread[par_stem] if last_succ[stem] == last_succ[par_stem] else last_succ[stem]
+            after = thread[last]
+        parent[u_out] = par_stem
+        thread[last] = thread_continue
+        rev_thread[thread_continue] = last
+        last_succ[u_out] = last
+
+        if old_rev_thread != v_in:
+            thread[old_rev_thread] = after
+            rev_thread[after] = old_rev_thread
+
+        for u in dirty_revs:
+            rev_thread[thread[u]] = u
+
+        # Predecessor edges, directions and subtree sizes along the reversed stem
+        tmp_sc = 0
+        tmp_ls = last_succ[u_out]
+        u = u_out
+        p = parent[u]
+        while u != u_in:
+            pred[u] = pred[p]
+            pred_dir[u] = -pred_dir[p]
+            tmp_sc += succ_num[u] - succ_num[p]
+            succ_num[u] = tmp_sc
+            last_succ[p] = tmp_ls
+            u = p
+            p = parent[u]
+        pred[u_in] = in_edge
+        pred_dir[u_in] = DIR_UP if u_in == source[in_edge] else DIR_DOWN
+        succ_num[u_in] = old_succ_num
+
+    # Last successors on the paths from v_in and v_out to the root
+    up_limit_out = join if last_succ[join] == v_in else -1
+    last_succ_out = last_succ[u_out]
+    u = v_in
+    while u != -1 and last_succ[u] == v_in:
+        last_succ[u] = last_succ_out
+        u = parent[u]
+
+    if join != old_rev_thread and v_in != old_rev_thread:
+        u = v_out
+        while u != up_limit_out and last_succ[u] == old_last_succ:
+            last_succ[u] = old_rev_thread
+            u = parent[u]
+    elif last_succ_out != old_last_succ:
+        u = v_out
+        while u != up_limit_out and last_succ[u] == old_last_succ:
+            last_succ[u] = last_succ_out
+            u = parent[u]
+
+    # Subtree sizes between the moved subtree and the join node
+    u = v_in
+    while u != join:
+        succ_num[u] += old_succ_num
+        u = parent[u]
+    u = v_out
+    while u != join:
+        succ_num[u] -= old_succ_num
+        u = parent[u]
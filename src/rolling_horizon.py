@@ -0,0 +1,236 @@
+"""
+Rolling-horizon decomposition for very large trip sets.
+
+The trip-to-trip network has O(n^2) back edges, out of reach for 5000-10000+
+trips. solve_rolling_horizon() splits the day into blocks of `window`
+minutes (by trip start) and solves them in order with the usual flow model:
+
+- Window k holds the trips starting in block k, the trips starting in the
+  next `overlap` minutes, and the trips window k-1 left uncommitted.
+- Every open taxi chain enters the window as a supply node: its last trip,
+  with no back edges into it, so the taxi is either sent on to a window
+  trip or left where it is, without counting as a new taxi.
+- Chains are then followed from the supply nodes and from the new taxis,
+  committing trips while they start inside block k. The rest (overlap
+  trips and whatever follows them) is solved again in window k+1.
+
+The committed segments stitch into a global schedule. A window network has
+at most (window trips + open chains) trip nodes, so peak memory is bounded
+by the window size and the fleet, not by the number of trips.
+
+The lower bound solves every block on its own (minimum fleet, no supply
+nodes). Under the 'simple' and 'start_time' rules a chain only moves
+forward in start time (end time for 'end_time'), so every chain of the full
+problem visits the trips of a block consecutively and the fleet of any block
+bounds the fleet of the day. The 'combined' rule can chain a trip to one
+that starts earlier and ends later, so it has no such bound. The block
+solves do not depend on each other and run in a process pool while the
+rolling pass goes on.
+"""
+
+import multiprocessing
+import time
+
+import numpy as np
+
+import tracing
+from utils import parse_args
+from instance import ProblemInstance
+from graph import BACK_EDGE, DEPOT, start_node
+from matching import minimum_fleet
+from routes import Routes, write_routes
+from timeline import plot_timeline
+
+# Trip column that only increases along a chain, per compatibility rule
+ORDER_COLUMN = {'simple': 0, 'start_time': 0, 'end_time': 1}
+
+# Per-process state of the lower bound workers
+_worker = {}
+
+
+def _init_worker(distances, max_memory):
+    _worker['distances'] = distances
+    _worker['max_memory'] = max_memory
+
+
+def _block_fleet(trips, distances, constraint_mode, max_memory=None):
+    """Minimum fleet of one block of trips on its own."""
+    block = ProblemInstance(trips, distances, max_memory)
+    used_taxis, _, _ = minimum_fleet(block.graph(constraint_mode=constraint_mode))
+    return used_taxis
+
+
+def _pool_block_fleet(task):
+    trips, constraint_mode = task
+    return _block_fleet(trips, _worker['distances'], constraint_mode, _worker['max_memory'])
+
+
+def _lower_bound_tasks(instance, constraint_mode, window):
+    """Lower bound block solves, or None when the rule has no time order."""
+    if constraint_mode not in ORDER_COLUMN or np.any(instance.start > instance.end):
+        return None
+    key = np.asarray(instance.trips[:, ORDER_COLUMN[constraint_mode]], dtype=np.int64)
+    block = (key - key.min(initial=0)) // window
+    order = np.argsort(block, kind='stable')
+    bounds = np.flatnonzero(np.diff(block[order])) + 1
+    return [(np.asarray(instance.trips[ids]), constraint_mode) for ids in np.split(order, bounds)]
+
+
+def _chain_distance(instance, chain):
+    """Empty distance driven by one taxi: depot -> trips -> depot."""
+    distances = instance.distances
+    pickup, dropoff = instance.pickup[chain], instance.dropoff[chain]
+    return int(distances[DEPOT, pickup[0]]) + int(distances[dropoff[:-1], pickup[1:]].sum()) \
+        + int(distances[dropoff[-1], DEPOT])
+
+
+def solve_rolling_horizon(instance, constraint_mode='simple', window=120, overlap=30,
+                          objective='lexicographic', solver='networkx', workers=1):
+    """
+    Solve a large instance window by window and stitch the taxi chains.
+
+    Args:
+        instance: ProblemInstance of the trips
+        constraint_mode: 'combined', 'end_time', 'start_time', or 'simple'
+        window: Length of a block in minutes
+        overlap: Minutes after the block also solved (not committed) in a window
+        objective: Objective of every window solve (see FlowGraph.cost)
+        solver: 'networkx' (network simplex) or 'simplex' (array-based network simplex)
+        workers: Processes for the lower bound block solves
+
+    Returns:
+        chains: List of taxi chains, each an array of 0-based trip ids
+        used_taxis: Number of taxis of the stitched schedule
+        empty_distance: Empty distance of the stitched schedule
+        lower_bound: Lower bound on the minimum fleet (None for 'combined')
+    """
+    if not (window > 0 and overlap >= 0):
+        raise ValueError(f"The window must be positive and the overlap non-negative (got {window} and {overlap})")
+    tasks = _lower_bound_tasks(instance, constraint_mode, window)
+    pool = pending = None
+    if tasks is not None and workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(instance.distances, instance.max_memory))
+        pending = pool.map_async(_pool_block_fleet, tasks, chunksize=1)
+
+    try:
+        start = instance.start
+        order = np.argsort(start, kind='stable')
+        sorted_start = start[order]
+
+        chains = []
+        uncommitted = np.zeros(0, dtype=np.int64)
+        position = 0
+        while position < instance.number_of_trips:
+            block_end = int(sorted_start[position]) + window
+            block_stop = int(np.searchsorted(sorted_start, block_end, side='left'))
+            ahead_stop = int(np.searchsorted(sorted_start, block_end + overlap, side='left'))
+            last = block_stop == instance.number_of_trips
+            supply = np.array([chain[-1] for chain in chains], dtype=np.int64)
+            local = np.concatenate((supply, uncommitted, order[position:ahead_stop]))
+            inside = np.zeros(len(local), dtype=bool)
+            inside[len(supply):] = start[local[len(supply):]] < block_end
+
+            successor = _solve_window(instance, supply, local[len(supply):], constraint_mode, objective, solver)
+            has_predecessor = np.zeros(len(local), dtype=bool)
+            has_predecessor[successor[successor >= 0]] = True
+            roots = np.flatnonzero(inside & ~has_predecessor).tolist()
+            if last:
+                # Trips linked in a closed loop ('combined' rule) start a chain of their own
+                roots += np.flatnonzero(inside & has_predecessor).tolist()
+
+            committed = np.zeros(len(local), dtype=bool)
+            for root in list(range(len(supply))) + roots:
+                if root < len(supply):
+                    chain, trip = chains[root], successor[root]
+                elif committed[root]:
+                    continue
+                else:
+                    chain, trip = [], root
+                    chains.append(chain)
+                while trip >= 0 and inside[trip] and not committed[trip]:
+                    committed[trip] = True
+                    chain.append(int(local[trip]))
+                    trip = successor[trip]
+
+            # Trips of the block reached only through overlap trips wait for the next window
+            uncommitted = local[inside & ~committed]
+            position = block_stop
+
+        lower_bound = None
+        if tasks is not None:
+            if pending is not None:
+                fleets = pending.get()
+            else:
+                fleets = [_block_fleet(trips, instance.distances, mode, instance.max_memory) for trips, mode in tasks]
+            lower_bound = max(fleets, default=0)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    chains = [np.array(chain, dtype=np.int64) for chain in chains]
+    empty_distance = sum(_chain_distance(instance, chain) for chain in chains)
+    return chains, len(chains), empty_distance, lower_bound
+
+
+@tracing.traced('window')
+def _solve_window(instance, supply, trips, constraint_mode, objective, solver):
+    """
+    Solve one window; supply holds the last trip of every open chain.
+
+    Returns:
+        successor: Window position of the trip served after every window
+                   position (supply first, then trips), -1 for none
+    """
+    window = ProblemInstance(
+        np.asarray(instance.trips[np.concatenate((supply, trips))]), instance.distances, instance.max_memory)
+    graph = window.graph(constraint_mode=constraint_mode)
+    # Open chains are already on the road: nothing leads into their last trip
+    graph = graph.subgraph(~((graph.kind == BACK_EDGE) & (graph.head < start_node(len(supply)))))
+    _, _, flow = graph.solve(graph.cost(objective), window.number_of_trips, solver, sparse=True)
+    return graph.successors(flow)
+
+
+def optimality_gap(used_taxis, lower_bound):
+    """Relative gap of a fleet size to its lower bound (None without a bound)."""
+    if lower_bound is None or lower_bound == 0:
+        return None
+    return (used_taxis - lower_bound) / lower_bound
+
+
+def main():
+    args = parse_args(
+        "Minimize Fleet Size (Rolling Horizon)", solvers=('networkx', 'simplex'), parallel=True, rolling=True,
+        timeline=True, routes=True,
+    )
+
+    with tracing.session(args):
+        instance = ProblemInstance.from_files(args.trips, args.distance, max_memory=args.max_memory)
+
+        start = time.time()
+        chains, used_taxis, empty_distance, lower_bound = solve_rolling_horizon(
+            instance, args.constraint_mode, args.window, args.overlap, solver=args.solver, workers=args.workers
+        )
+        end = time.time()
+
+        print('------------------------------------')
+        print('Used Taxi:', used_taxis)
+        print('Empty Distance:', empty_distance)
+        gap = optimality_gap(used_taxis, lower_bound)
+        if gap is None:
+            print('Lower Bound: n/a (no time order under the', args.constraint_mode, 'rule)')
+        else:
+            print('Lower Bound:', lower_bound, f'(gap {gap:.2%})')
+        print('------------------------------------')
+        print('Execution Time: ', end - start, 's')
+        print('------------------------------------')
+
+        routes = Routes.from_chains(instance, chains)
+        if args.routes:
+            write_routes(instance, routes, args.routes)
+        if args.timeline:
+            plot_timeline(instance, routes, args.timeline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Taxi routes decoded from a flow, and their export.
+
+decode_routes() turns the edges carrying flow into per-taxi routes in one
+pass over the trips (see matching.taxi_chains: one successor per trip,
+followed iteratively, so chain length is not limited by the recursion
+limit). The flow may be dense or the (edges, values) pair returned by
+FlowGraph.solve(..., sparse=True).
+
+Routes are stored in CSR layout, like the graph indexes: the stops of taxi
+k are positions indptr[k]:indptr[k + 1] of the trip/deadhead/idle arrays.
+write_routes() streams them to CSV (one row per stop) or JSON lines (one
+object per taxi) a chunk at a time, so large schedules are never turned
+into one big string or list of dicts.
+
+Under the 'combined' rule compatibility is not acyclic, and a minimum-cost
+flow may contain closed loops of trips that no taxi leaves the parking
+for (they cost nothing in the fleet objective). Such routes are kept,
+flagged in the loop array, and are not counted in used_taxis.
+"""
+
+import json
+
+import numpy as np
+
+import tracing
+from graph import DEPOT
+from matching import taxi_chains
+
+# Taxis written per chunk by write_routes
+ROUTE_CHUNK_SIZE = 1000
+
+CSV_COLUMNS = (
+    'taxi', 'stop', 'trip', 'start', 'end', 'pickup', 'dropoff', 'deadhead', 'idle', 'return_deadhead', 'loop',
+)
+
+
+class Routes:
+    """
+    Taxi routes in CSR layout.
+
+    Attributes:
+        indptr: Offsets of the routes (int64, one more than the number of taxis)
+        trip: 0-based trip ids in service order, taxi after taxi
+        deadhead: Empty distance driven to the pickup of each trip (from the
+                  depot for the first trip of a taxi)
+        idle: Time between the end of the previous trip and the start of
+              each trip, as in FlowGraph.idle (0 for the first trip of a taxi)
+        return_deadhead: Empty distance from the last dropoff back to the depot, per taxi
+        loop: Whether each route is a closed loop of trips without a taxi:
+              the first trip is reached from the last dropoff instead of the
+              depot, and there is no return to the depot
+    """
+
+    def __init__(self, indptr, trip, deadhead, idle, return_deadhead, loop):
+        self.indptr = indptr
+        self.trip = trip
+        self.deadhead = deadhead
+        self.idle = idle
+        self.return_deadhead = return_deadhead
+        self.loop = loop
+
+    @classmethod
+    def from_chains(cls, instance, chains, loop=None):
+        """
+        Routes of a list of taxi chains.
+
+        Args:
+            instance: ProblemInstance of the trips
+            chains: List of taxi chains, each an array of 0-based trip ids
+            loop: Which chains are closed loops (see Routes.loop; None for none)
+        """
+        distances = instance.distances
+        indptr = np.zeros(len(chains) + 1, dtype=np.int64)
+        np.cumsum([len(chain) for chain in chains], out=indptr[1:])
+        trip = np.concatenate(chains).astype(np.int64) if chains else np.zeros(0, dtype=np.int64)
+
+        loop = np.zeros(len(chains), dtype=bool) if loop is None else np.asarray(loop, dtype=bool)
+
+        first, last = indptr[:-1], indptr[1:] - 1
+        previous = np.roll(trip, 1)
+        # A loop closes from its last trip back to its first
+        previous[first[loop]] = trip[last[loop]]
+        deadhead = distances[instance.dropoff[previous], instance.pickup[trip]]
+        idle = instance.start[trip] - instance.end[previous]
+        taxi = first[~loop]
+        deadhead[taxi] = distances[DEPOT, instance.pickup[trip[taxi]]]
+        idle[first] = 0
+        return_deadhead = np.where(loop, 0, distances[instance.dropoff[trip[last]], DEPOT])
+        return cls(indptr, trip, deadhead, idle, return_deadhead, loop)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def used_taxis(self):
+        """Number of taxis: the routes that are not closed loops."""
+        return int(np.count_nonzero(~self.loop))
+
+    def chains(self):
+        """Trip ids of every taxi, as a list of taxi chains (see matching.taxi_chains)."""
+        return np.split(self.trip, self.indptr[1:-1])
+
+    def route(self, taxi):
+        """Trip ids, deadhead distances and idle times of one taxi."""
+        stops = slice(self.indptr[taxi], self.indptr[taxi + 1])
+        return self.trip[stops], self.deadhead[stops], self.idle[stops]
+
+    def empty_distance(self):
+        """Total empty distance, depot legs included."""
+        return int(self.deadhead.sum()) + int(self.return_deadhead.sum())
+
+
+@tracing.traced('decode')
+def decode_routes(instance, graph, flow):
+    """
+    Per-taxi routes of a flow.
+
+    Args:
+        instance: ProblemInstance of the trips
+        graph: FlowGraph (or TimeSpaceGraph) the flow belongs to
+        flow: Dense edge flow, or (edges, values) of the nonzero flows
+
+    Returns:
+        routes: Routes
+    """
+    chains = taxi_chains(graph, flow)
+    successor = graph.successors(flow)
+    loop = np.array([successor[chain[-1]] == chain[0] for chain in chains], dtype=bool)
+    return Routes.from_chains(instance, chains, loop)
+
+
+@tracing.traced('export', kind='routes')
+def write_routes(instance, routes, output_file):
+    """
+    Stream routes to a file.
+
+    The format follows the extension: .csv writes one row per stop (columns
+    CSV_COLUMNS; return_deadhead is only set on the last stop of a taxi,
+    loop is 1 on every stop of a closed loop), .jsonl one object per taxi.
+    Taxis and trips are numbered from 1, as in the trip_<i> node names.
+
+    Args:
+        instance: ProblemInstance of the trips
+        routes: Routes
+        output_file: Output path
+    """
+    if output_file.endswith('.csv'):
+        header, write_chunk = ','.join(CSV_COLUMNS) + '\n', _write_csv_chunk
+    elif output_file.endswith('.jsonl'):
+        header, write_chunk = '', _write_jsonl_chunk
+    else:
+        raise ValueError(f"Unknown routes format: {output_file} (expected .csv or .jsonl)")
+
+    with open(output_file, 'w', newline='') as f:
+        f.write(header)
+        for first in range(0, len(routes), ROUTE_CHUNK_SIZE):
+            write_chunk(f, instance, routes, first, min(first + ROUTE_CHUNK_SIZE, len(routes)))
+    print("Routes saved to", output_file)
+
+
+def _write_csv_chunk(f, instance, routes, first, last):
+    low, high = routes.indptr[first], routes.indptr[last]
+    lengths = np.diff(routes.indptr[first:last + 1])
+    trip = routes.trip[low:high]
+    taxi = np.repeat(np.arange(first, last), lengths)
+    stop = np.arange(low, high) - np.repeat(routes.indptr[first:last], lengths)
+    return_deadhead = np.zeros(high - low, dtype=np.int64)
+    return_deadhead[routes.indptr[first + 1:last + 1] - 1 - low] = routes.return_deadhead[first:last]
+    table = np.column_stack((
+        taxi + 1, stop + 1, trip + 1, instance.start[trip], instance.end[trip],
+        instance.pickup[trip], instance.dropoff[trip],
+        routes.deadhead[low:high], routes.idle[low:high], return_deadhead,
+        np.repeat(routes.loop[first:last], lengths),
+    ))
+    np.savetxt(f, table, fmt='%d', delimiter=',')
+
+
+def _write_jsonl_chunk(f, instance, routes, first, last):
+    for taxi in range(first, last):
+        trip, deadhead, idle = routes.route(taxi)
+        f.write(json.dumps({
+            'taxi': taxi + 1,
+            'trips': (trip + 1).tolist(),
+            'deadhead': deadhead.tolist(),
+            'idle': idle.tolist(),
+            'return_deadhead': int(routes.return_deadhead[taxi]),
+            'loop': bool(routes.loop[taxi]),
+        }) + '\n')
@@ -0,0 +1,286 @@
+"""
+Content-addressed on-disk cache of solutions (and optionally networks).
+
+Reruns on the same data repeat the same work: preprocessing, network build
+and solve. SolutionCache stores what a solve produced, keyed by what it
+depends on, so an identical rerun only hashes its inputs and reads a file:
+
+- the SHA-256 of the trip table and of the distance matrix (their contents,
+  not their paths: a renamed or regenerated-but-identical file still hits),
+- the network formulation and the compatibility rule,
+- the objective and the solver, with the solver's version (the package
+  version for NetworkX, a hash of the source for the solvers of this repo),
+- whether the network was presolved (a presolved solve may pick another
+  optimal solution, so its routes are kept apart),
+- a hash of the source of the modules that build the network and decode
+  the routes (MODEL_MODULES), so editing a compatibility rule or the
+  network construction never returns a stale solution,
+- CACHE_FORMAT, bumped whenever the layout of an entry changes.
+
+An entry is one .npz file: the objective values as JSON, the routes in the
+compact CSR form of routes.Routes (indptr, trip ids and loop flags;
+distances and idle times are derived again from the instance) and the nonzero flows of the
+network. With graphs=True the flow networks are cached too (see
+ProblemInstance.graph), as the edge arrays of the FlowGraph; the CSR
+indexes are rebuilt on load.
+
+solve_cached() wraps a solve: on a hit neither the network nor the solver
+is touched, and on a miss the routes are decoded and stored.
+
+Files are written atomically (temporary file, then os.replace), hits touch
+their file, and put() evicts the least recently used files once the
+directory holds more than max_size bytes. Any unreadable entry (truncated,
+corrupt, or missing an array) counts as a miss, so a corrupt or foreign
+file never fails a run.
+"""
+
+import hashlib
+import importlib
+import json
+import os
+import zipfile
+
+import numpy as np
+
+import tracing
+from utils import SOLUTION_CACHE_DIR, SOLUTION_CACHE_SIZE
+from graph import FlowGraph, nonzero_flow
+from routes import Routes, decode_routes
+from timespace import TimeSpaceGraph
+
+# Version of the entry layout; part of every key
+CACHE_FORMAT = 3
+
+# Module implementing every solver; its version goes into the key
+SOLVER_MODULES = {
+    'networkx': 'networkx',
+    'simplex': 'network_simplex',
+    'matching': 'matching',
+}
+
+# Modules whose source shapes the network and the decoded routes; their hash goes into every key
+MODEL_MODULES = ('utils', 'compatibility', 'graph', 'timespace', 'presolve', 'matching', 'routes')
+
+# Errors of reading a damaged or foreign entry
+ENTRY_ERRORS = (OSError, ValueError, KeyError, IndexError, EOFError, zipfile.BadZipFile)
+
+# Arrays of a cached network, besides the time-space event arrays
+GRAPH_ARRAYS = ('pickup', 'dropoff', 'tail', 'head', 'kind', 'capacity', 'distance', 'idle', 'demand')
+
+
+def solver_version(solver):
+    """Version string of a solver: its package version, or a hash of its source."""
+    module = importlib.import_module(SOLVER_MODULES.get(solver, solver))
+    version = getattr(module, '__version__', None)
+    if version is not None:
+        return f"{solver}-{version}"
+    return f"{solver}-{_source_digest(module)}"
+
+
+def model_version():
+    """Hash of the source of MODEL_MODULES."""
+    return '-'.join(_source_digest(importlib.import_module(name)) for name in MODEL_MODULES)
+
+
+def _source_digest(module):
+    with open(module.__file__, 'rb') as fp:
+        return hashlib.sha256(fp.read()).hexdigest()[:16]
+
+
+def open_cache(args):
+    """SolutionCache of the --cache-* options (see utils.add_cache_arguments), None with --no-cache."""
+    if args.no_cache:
+        return None
+    return SolutionCache(args.cache_dir, args.cache_size, args.cache_graph)
+
+
+def solve_cached(cache, instance, network, constraint_mode, objective, solver, solve, presolve=False):
+    """
+    Solution of a solve, read from the cache when possible.
+
+    Args:
+        cache: SolutionCache (None to always solve)
+        instance: ProblemInstance of the trips
+        network, constraint_mode, objective, solver: Key of the solve (see SolutionCache.key)
+        solve: Function solving the problem; returns (values, graph, flow)
+               with values a JSON-serializable dict of objective values
+        presolve: Whether solve() presolves the network (part of the key)
+
+    Returns:
+        values: Dict of objective values
+        routes: Routes of the solution
+        flow: (edges, values) of the nonzero flows on the network
+        cached: Whether the solution came from the cache
+    """
+    key = None
+    if cache is not None:
+        key = cache.key(instance, network, constraint_mode, objective, solver, presolve)
+        hit = cache.get(key, instance)
+        if hit is not None:
+            return (*hit, True)
+
+    values, graph, flow = solve()
+    routes = decode_routes(instance, graph, flow)
+    flow = nonzero_flow(flow)
+    if cache is not None:
+        cache.put(key, values, routes, flow)
+    return values, routes, flow, False
+
+
+class SolutionCache:
+    """
+    Size-bounded LRU cache of solutions in a directory.
+
+    Attributes:
+        directory: Cache directory (created on the first write)
+        max_size: Size bound of the directory in bytes
+        graphs: Also cache the flow networks (see ProblemInstance.graph)
+    """
+
+    def __init__(self, directory=SOLUTION_CACHE_DIR, max_size=SOLUTION_CACHE_SIZE, graphs=False):
+        self.directory = directory
+        self.max_size = max_size
+        self.graphs = graphs
+
+    def key(self, instance, network, constraint_mode, objective, solver, presolve=False):
+        """
+        Key of a solve.
+
+        Args:
+            instance: ProblemInstance of the trips
+            network: 'trip' or 'time-space'
+            constraint_mode: 'combined', 'end_time', 'start_time', or 'simple'
+            objective: Objective of the solve (see FlowGraph.cost)
+            solver: Solver name (see SOLVER_MODULES)
+            presolve: Whether the network is presolved
+
+        Returns:
+            key: Hex digest naming the entry
+        """
+        return self._key(
+            instance, 'solution', network, constraint_mode, objective, solver_version(solver), bool(presolve))
+
+    def get(self, key, instance):
+        """
+        Cached solution of a key.
+
+        Args:
+            key: Key of the solve (see key())
+            instance: ProblemInstance of the trips (to derive the routes)
+
+        Returns:
+            values: Dict of objective values given to put()
+            routes: Routes of the solution (None when none were stored)
+            flow: (edges, values) of the nonzero flows (None when none were stored)
+            or None on a miss
+        """
+        def read(entry):
+            values = json.loads(str(entry['values']))
+            routes = flow = None
+            if 'trip' in entry:
+                chains = np.split(entry['trip'].astype(np.int64), entry['indptr'][1:-1])
+                routes = Routes.from_chains(instance, chains, entry['loop'])
+            if 'flow_edges' in entry:
+                flow = (entry['flow_edges'].astype(np.int64), entry['flow_values'])
+            return values, routes, flow
+
+        return self._load(key + '.npz', read)
+
+    def put(self, key, values, routes=None, flow=None):
+        """
+        Store a solution.
+
+        Args:
+            key: Key of the solve (see key())
+            values: JSON-serializable dict of objective values
+            routes: Routes of the solution (optional)
+            flow: Nonzero flows of the solution, as an (edges, values) pair (optional)
+        """
+        arrays = {'values': np.array(json.dumps(values))}
+        if routes is not None:
+            arrays['indptr'] = routes.indptr.astype(np.int64)
+            arrays['trip'] = routes.trip.astype(np.int32)
+            arrays['loop'] = routes.loop
+        if flow is not None:
+            arrays['flow_edges'] = np.asarray(flow[0], dtype=np.int64)
+            arrays['flow_values'] = np.asarray(flow[1], dtype=np.int32)
+        self._store(key + '.npz', arrays)
+
+    def load_graph(self, instance, network, constraint_mode):
+        """
+        Cached flow network of an instance.
+
+        Args:
+            instance: ProblemInstance of the trips
+            network: 'trip' or 'time-space'
+            constraint_mode: 'combined', 'end_time', 'start_time', or 'simple'
+
+        Returns:
+            graph: FlowGraph (TimeSpaceGraph for the time-space network), or None on a miss
+        """
+        def read(entry):
+            with tracing.span('cache_load', kind='graph'):
+                arrays = [entry[array] for array in GRAPH_ARRAYS]
+                if 'event_location' in entry:
+                    return TimeSpaceGraph(
+                        instance.number_of_trips, *arrays, entry['event_location'], entry['event_time'])
+                return FlowGraph(instance.number_of_trips, *arrays)
+
+        return self._load(self._key(instance, 'graph', network, constraint_mode) + '.graph.npz', read)
+
+    def store_graph(self, instance, network, constraint_mode, graph):
+        """Store the flow network of an instance (see load_graph)."""
+        arrays = {array: getattr(graph, array) for array in GRAPH_ARRAYS}
+        if isinstance(graph, TimeSpaceGraph):
+            arrays['event_location'], arrays['event_time'] = graph.event_location, graph.event_time
+        self._store(self._key(instance, 'graph', network, constraint_mode) + '.graph.npz', arrays)
+
+    def _key(self, instance, *parts):
+        parts = [CACHE_FORMAT, model_version(), instance.digest(), *parts]
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+    def _load(self, name, read):
+        """read() of the arrays of an entry, or None when it is missing or unreadable."""
+        path = os.path.join(self.directory, name)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                entry = {array: entry[array] for array in entry.files}
+            result = read(entry)
+            os.utime(path)
+        except ENTRY_ERRORS:
+            tracing.count('cache.misses')
+            return None
+        tracing.count('cache.hits')
+        return result
+
+    @tracing.traced('cache_store')
+    def _store(self, name, arrays):
+        path = os.path.join(self.directory, name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            partial = path + '.' + str(os.getpid()) + '.tmp'
+            with open(partial, 'wb') as fp:
+                np.savez(fp, **arrays)
+            os.replace(partial, path)
+        except OSError:
+            return  # read-only directory or full disk: just skip the cache
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the directory fits in max_size."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.npz'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                tracing.count('cache.evictions')
+            except OSError:
+                pass  # removed by a concurrent run
+            size -= entry_size
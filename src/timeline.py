@@ -0,0 +1,152 @@
+"""
+Timeline rendering of a schedule, for solutions of any size.
+
+The network plots of the scripts (nx.draw with every node labelled) are only
+readable for a few dozen trips. plot_timeline() draws the solution instead:
+one row per taxi, every trip a bar from its start to its end time, and the
+empty drives as thin segments (from the depot, between trips and back to
+the depot), so the idle time shows as the gaps. Closed loops of trips
+without a taxi ('combined' rule, see routes.py) get rows of their own after
+the taxis, in a different colour. The compatibility edges are
+not drawn one by one; with a trip network they are aggregated into a density
+of compatible pairs by end time of the first trip and start time of the next.
+
+Everything is drawn into collections on a matplotlib Figure that is saved
+directly (PNG, SVG or PDF by extension), without pyplot, so it runs headless
+and never blocks.
+"""
+
+import os
+
+import numpy as np
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+
+import tracing
+from graph import BACK_EDGE, node_trip
+
+# Above this many trips the scripts skip the nx.draw network plots
+NETWORK_PLOT_MAX_TRIPS = 200
+
+# Height of a taxi row and limits of the figure height, in inches
+ROW_HEIGHT = 0.15
+MIN_HEIGHT = 3
+MAX_HEIGHT = 30
+
+
+def schedule_segments(routes, instance):
+    """
+    Trip bars and empty drives of every taxi.
+
+    Args:
+        routes: Routes of the schedule (see routes.py)
+        instance: ProblemInstance of the trips
+
+    Returns:
+        trips: (n, 3) array of (row, start, end) per trip
+        drives: (k, 3) array of (row, departure, arrival) per empty drive
+    """
+    row = np.repeat(np.arange(len(routes)), np.diff(routes.indptr))
+    start, end = instance.start[routes.trip], instance.end[routes.trip]
+    trips = np.column_stack((row, start, end))
+
+    # The first trip of a taxi is reached from the depot, the others from the previous dropoff
+    first = np.zeros(len(row), dtype=bool)
+    first[routes.indptr[:-1]] = True
+    following = np.flatnonzero(~first)
+    last = routes.indptr[1:] - 1
+    drives = np.concatenate((
+        np.column_stack((row[first], start[first] - routes.deadhead[first], start[first])),
+        np.column_stack((row[following], end[following - 1], end[following - 1] + routes.deadhead[following])),
+        np.column_stack((row[last], end[last], end[last] + routes.return_deadhead)),
+    ))
+    return trips, drives
+
+
+def compatibility_density(instance, graph, bin_minutes=30):
+    """
+    Compatible pairs of a trip network counted per time bin.
+
+    Args:
+        instance: ProblemInstance of the trips
+        graph: FlowGraph with one back edge per compatible pair
+        bin_minutes: Width of the time bins
+
+    Returns:
+        counts: 2D histogram, [i, j] = pairs whose first trip ends in bin i
+                and whose next trip starts in bin j
+        edges: Bin edges in minutes (shared by both axes)
+    """
+    back = graph.kind == BACK_EDGE
+    tails, heads = node_trip(graph.tail[back]), node_trip(graph.head[back])
+    low = min(int(instance.start.min(initial=0)), int(instance.end.min(initial=0)))
+    high = max(int(instance.start.max(initial=0)), int(instance.end.max(initial=0))) + 1
+    edges = np.arange(low - low % bin_minutes, high + bin_minutes, bin_minutes)
+    counts, _, _ = np.histogram2d(instance.end[tails], instance.start[heads], bins=(edges, edges))
+    return counts, edges
+
+
+@tracing.traced('plot', kind='timeline')
+def plot_timeline(instance, routes, output_file, graph=None, title=None):
+    """
+    Draw a schedule as a timeline and save it to a file.
+
+    Args:
+        instance: ProblemInstance of the trips
+        routes: Routes of the schedule (see routes.py)
+        output_file: Image path; the format follows the extension (.png, .svg, .pdf)
+        graph: Trip network of the solve; when given, its compatible pairs
+               are drawn as a density next to the timeline
+        title: Figure title (defaults to the number of taxis and trips)
+    """
+    trips, drives = schedule_segments(routes, instance)
+    number_of_taxis, number_of_rows = routes.used_taxis, len(routes)
+    density = graph is not None and graph.count(BACK_EDGE) > 0
+
+    height = min(max(MIN_HEIGHT, 1 + ROW_HEIGHT * number_of_rows), MAX_HEIGHT)
+    figure = Figure(figsize=(16 if density else 12, height), layout='constrained')
+    if density:
+        timeline, pairs = figure.subplots(1, 2, gridspec_kw={'width_ratios': (3, 1)})
+    else:
+        timeline = figure.subplots()
+
+    # One rectangle per trip, one segment per empty drive
+    row, start, end = trips.T
+    bars = np.stack((
+        np.column_stack((start, row - 0.35)), np.column_stack((end, row - 0.35)),
+        np.column_stack((end, row + 0.35)), np.column_stack((start, row + 0.35)),
+    ), axis=1)
+    loop = routes.loop[row]
+    timeline.add_collection(PolyCollection(bars[~loop], facecolors='tab:blue', edgecolors='none', label='trip'))
+    if loop.any():
+        timeline.add_collection(PolyCollection(bars[loop], facecolors='tab:gray', edgecolors='none',
+                                               label='trip in a loop (no taxi)'))
+    row, departure, arrival = drives.T
+    segments = np.stack((np.column_stack((departure, row)), np.column_stack((arrival, row))), axis=1)
+    timeline.add_collection(LineCollection(segments, colors='tab:red', linewidths=1, label='empty drive'))
+
+    times = np.concatenate((trips[:, 1:].ravel(), drives[:, 1:].ravel()))
+    if len(times):
+        timeline.set_xlim(times.min(), times.max())
+    timeline.set_ylim(number_of_rows - 0.5, -0.5)
+    timeline.set_xlabel('Time (min)')
+    timeline.set_ylabel('Taxi')
+    timeline.legend(loc='upper right')
+    if title is None:
+        title = f"{number_of_taxis} taxis, {instance.number_of_trips} trips"
+        if number_of_rows > number_of_taxis:
+            title += f" ({number_of_rows - number_of_taxis} loops without a taxi)"
+    timeline.set_title(title)
+
+    if density:
+        counts, edges = compatibility_density(instance, graph)
+        image = pairs.pcolormesh(edges, edges, counts.T, norm=LogNorm(vmin=1), cmap='viridis')
+        figure.colorbar(image, ax=pairs, label='Compatible pairs')
+        pairs.set_xlabel('End of first trip (min)')
+        pairs.set_ylabel('Start of next trip (min)')
+        pairs.set_title(f"{graph.count(BACK_EDGE)} compatible pairs")
+
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    figure.savefig(output_file, dpi=150)
+    print("Timeline saved to", output_file)
@@ -0,0 +1,179 @@
+"""
+Time-space network for the 'simple' compatibility rule.
+
+Instead of one back edge per compatible trip pair, idle taxis wait on a
+timeline per pickup location. Every location has one event node per
+distinct departure time of the trips picked up there, linked by waiting
+arcs. A taxi finishing trip i drives to each location q and joins its
+timeline at the first departure it can still reach (end_i + D(d_i, q));
+from an event node it boards one of the trips leaving at that time.
+
+Any path trip_i_end -> timeline of q -> trip_j_start corresponds to a back
+edge i -> j of the 'simple' rule with the same empty distance, so the
+network has the same optimal fleet size and empty distance as the
+trip-to-trip model, with O(n * m) arcs for n trips and m locations.
+"""
+
+import numpy as np
+
+import tracing
+from graph import (
+    EDGE_KIND_NAMES,
+    FlowGraph,
+    PARKING_START,
+    PARKING_END,
+    GARBAGE_EDGE,
+    START_EDGE,
+    END_EDGE,
+    DEPOT,
+    start_node,
+    end_node,
+    node_trip,
+    nonzero_flow,
+    count_network,
+)
+from utils import distance_array, trips_to_arrays
+
+# Edge kinds of the time-space network
+REPOSITION_EDGE = 4
+WAIT_EDGE = 5
+BOARD_EDGE = 6
+
+# Counter names of the edge kinds (indexed by kind)
+TIME_SPACE_EDGE_KIND_NAMES = EDGE_KIND_NAMES + ('reposition', 'wait', 'board')
+
+
+class TimeSpaceGraph(FlowGraph):
+    """
+    FlowGraph whose trip ends connect to per-location timelines.
+
+    Attributes (besides FlowGraph's):
+        event_location, event_time: Location and time of every timeline node,
+            numbered after the trip nodes
+    """
+
+    def __init__(self, number_of_trips, pickup, dropoff, tail, head, kind, capacity, distance, idle, demand,
+                 event_location, event_time):
+        super().__init__(number_of_trips, pickup, dropoff, tail, head, kind, capacity, distance, idle, demand)
+        self.event_location = event_location
+        self.event_time = event_time
+
+    @tracing.traced('decode')
+    def successors(self, flow):
+        """
+        Trip served right after every trip (-1 when the taxi returns to the parking).
+
+        Taxis waiting on a timeline are interchangeable, so each boarding is
+        paired with a taxi that joined the timeline at or before that event.
+        """
+        successor = np.full(self.number_of_trips, -1, dtype=np.int64)
+        first_event = 2 + 2 * self.number_of_trips
+
+        edges, _ = nonzero_flow(flow)
+        arrivals = edges[self.kind[edges] == REPOSITION_EDGE]
+        boardings = edges[self.kind[edges] == BOARD_EDGE]
+        arrival_event = self.head[arrivals] - first_event
+        boarding_event = self.tail[boardings] - first_event
+
+        for location in np.unique(self.event_location[boarding_event]).tolist():
+            here = self.event_location[arrival_event] == location
+            waiting_taxis = node_trip(self.tail[arrivals[here]])[np.argsort(arrival_event[here], kind='stable')]
+            arrival_times = np.sort(arrival_event[here])
+            here = self.event_location[boarding_event] == location
+            boarded = node_trip(self.head[boardings[here]])[np.argsort(boarding_event[here], kind='stable')]
+            boarding_times = np.sort(boarding_event[here])
+
+            # Walk the timeline: a boarding takes any taxi already waiting (stack order)
+            waiting = []
+            next_arrival = 0
+            for trip, event in zip(boarded.tolist(), boarding_times.tolist()):
+                while next_arrival < len(arrival_times) and arrival_times[next_arrival] <= event:
+                    waiting.append(int(waiting_taxis[next_arrival]))
+                    next_arrival += 1
+                successor[waiting.pop()] = trip
+        return successor
+
+
+@tracing.traced('graph_build', network='time-space')
+def build_time_space_graph(trips, distances):
+    """
+    Build the time-space fleet network ('simple' compatibility rule).
+
+    Args:
+        trips: List of trip data
+        distances: Distance matrix
+
+    Returns:
+        graph: TimeSpaceGraph, usable wherever a FlowGraph is
+    """
+    start, end, pickup, dropoff = trips_to_arrays(trips)
+    dense = distance_array(distances)
+    number_of_trips = len(trips)
+    trip_ids = np.arange(number_of_trips, dtype=np.int64)
+
+    if np.any(end + dense[dropoff, pickup] <= start):
+        raise ValueError("The time-space network needs end_time + D(dropoff, pickup) > start_time for every trip")
+
+    # Timeline nodes: distinct (pickup location, departure time) pairs
+    events, event_of_trip = np.unique(np.stack((pickup, start), axis=1), axis=0, return_inverse=True)
+    event_of_trip = event_of_trip.reshape(-1)
+    event_location, event_time = events[:, 0], events[:, 1]
+    locations = np.unique(event_location)
+    bounds = np.append(np.searchsorted(event_location, locations), len(events))
+    first_event = 2 + 2 * number_of_trips
+
+    # Reposition arcs: trip end -> first reachable departure at every location
+    reposition_tails, reposition_events, reposition_distance = [], [], []
+    for k, location in enumerate(locations.tolist()):
+        low, high = bounds[k], bounds[k + 1]
+        arrival = end + dense[dropoff, location]
+        position = low + np.searchsorted(event_time[low:high], arrival, side='left')
+        reachable = position < high
+        reposition_tails.append(trip_ids[reachable])
+        reposition_events.append(position[reachable])
+        reposition_distance.append(dense[dropoff[reachable], location])
+    reposition_tails = np.concatenate(reposition_tails) if reposition_tails else trip_ids[:0]
+    reposition_events = np.concatenate(reposition_events) if reposition_events else trip_ids[:0]
+    reposition_distance = np.concatenate(reposition_distance) if reposition_distance else trip_ids[:0]
+
+    # Waiting arcs between consecutive departures of the same location
+    waits = np.flatnonzero(event_location[1:] == event_location[:-1])
+
+    tail = np.concatenate((
+        [PARKING_START], np.full(number_of_trips, PARKING_START), end_node(trip_ids),
+        end_node(reposition_tails), first_event + waits, first_event + event_of_trip,
+    )).astype(np.int32)
+    head = np.concatenate((
+        [PARKING_END], start_node(trip_ids), np.full(number_of_trips, PARKING_END),
+        first_event + reposition_events, first_event + waits + 1, start_node(trip_ids),
+    )).astype(np.int32)
+    kind = np.concatenate((
+        [GARBAGE_EDGE], np.full(number_of_trips, START_EDGE), np.full(number_of_trips, END_EDGE),
+        np.full(len(reposition_tails), REPOSITION_EDGE), np.full(len(waits), WAIT_EDGE),
+        np.full(number_of_trips, BOARD_EDGE),
+    )).astype(np.int8)
+    capacity = np.ones(len(tail), dtype=np.int32)
+    capacity[0] = number_of_trips
+    capacity[kind == WAIT_EDGE] = number_of_trips
+    distance = np.concatenate((
+        [0], dense[DEPOT, pickup], dense[dropoff, DEPOT],
+        reposition_distance, np.zeros(len(waits) + number_of_trips, dtype=np.int64),
+    )).astype(np.int32)
+    # Idle time telescopes along trip end -> timeline -> trip start to start_j - end_i
+    idle = np.concatenate((
+        np.zeros(1 + 2 * number_of_trips, dtype=np.int64), event_time[reposition_events] - end[reposition_tails],
+        event_time[waits + 1] - event_time[waits], np.zeros(number_of_trips, dtype=np.int64),
+    )).astype(np.int32)
+
+    demand = np.zeros(first_event + len(events), dtype=np.int32)
+    demand[PARKING_START], demand[PARKING_END] = -number_of_trips, number_of_trips
+    demand[2:first_event:2] = 1
+    demand[3:first_event:2] = -1
+
+    graph = TimeSpaceGraph(
+        number_of_trips, pickup.astype(np.int32), dropoff.astype(np.int32),
+        tail, head, kind, capacity, distance, idle, demand,
+        event_location.astype(np.int32), event_time.astype(np.int32),
+    )
+    count_network(graph, TIME_SPACE_EDGE_KIND_NAMES)
+    return graph
@@ -0,0 +1,131 @@
+"""
+Tracing and profiling hooks shared by all entry points.
+
+With --trace [FILE] (see utils.parse_args) every stage is reported as one
+JSON line when it ends: name, parent stage, nesting depth, start offset and
+duration in seconds, plus any fields given to span(). A final 'counters'
+line holds the counters (compatibility checks, nodes and edges per kind,
+solver iterations, ...). Stages and counters are marked where they happen:
+
+    with tracing.span('solve', solver='simplex'):
+        ...
+    tracing.count('network.edges.back', number_of_back_edges)
+
+Functions that are a stage as a whole are decorated with @traced('name').
+Without --trace all of these are no-ops, so library code calls them freely.
+--profile FILE runs the session under cProfile and dumps pstats data to
+FILE (read it with python -m pstats FILE).
+
+The tracer is per process: solves in pool workers are not reported.
+"""
+
+import contextlib
+import cProfile
+import functools
+import json
+import sys
+import threading
+import time
+
+
+class Tracer:
+    """Writes spans and counters as JSON lines to a stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.counters = {}
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def span(self, name, **fields):
+        stack = self._local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            self._write({
+                'type': 'span', 'name': name, 'parent': parent, 'depth': len(stack),
+                'start': round(start - self._origin, 6), 'duration': round(duration, 6), **fields,
+            })
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def close(self):
+        self._write({'type': 'counters', **dict(sorted(self.counters.items()))})
+
+    def _write(self, record):
+        with self._lock:
+            self.stream.write(json.dumps(record) + '\n')
+            self.stream.flush()
+
+
+# Tracer of the running session (None when tracing is off)
+_tracer = None
+
+
+def span(name, **fields):
+    """Context manager timing one stage (no-op unless tracing)."""
+    if _tracer is None:
+        return contextlib.nullcontext()
+    return _tracer.span(name, **fields)
+
+
+def traced(name, **fields):
+    """Decorator running every call of a function inside span(name, **fields)."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with _tracer.span(name, **fields):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    """Add value to a counter (no-op unless tracing)."""
+    if _tracer is not None:
+        _tracer.count(name, value)
+
+
+@contextlib.contextmanager
+def session(args):
+    """
+    Trace and/or profile the body according to the --trace and --profile options.
+
+    Args:
+        args: Parsed arguments (see utils.parse_args)
+    """
+    global _tracer
+    trace_file = getattr(args, 'trace', None)
+    profile_file = getattr(args, 'profile', None)
+
+    stream = None
+    if trace_file is not None:
+        stream = sys.stderr if trace_file == '-' else open(trace_file, 'w')
+        _tracer = Tracer(stream)
+    profiler = None
+    if profile_file is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with span('total'):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+        if stream is not None:
+            _tracer.close()
+            _tracer = None
+            if stream is not sys.stderr:
+                stream.close()
@@ -8,15 +8,49 @@ This module contains common functions used across all optimization approaches:
 """
 
 import argparse
+import gzip
+import hashlib
+import os
 
+import numpy as np
 
-# Global state (preserved from original design)
-matrixD = list()
-trips_converter = {}  # type: dict
+import tracing
 
 
-def parse_args(description="Taxi Fleet Optimization"):
-    """Parse command line arguments for dataset and distance matrix paths."""
+# Directory (next to the distance file) holding the parsed .npy matrices
+DISTANCE_CACHE_DIR = '.distance_cache'
+
+# Default directory and size bound (bytes) of the solution cache (see solution_cache.py)
+SOLUTION_CACHE_DIR = '.solution_cache'
+SOLUTION_CACHE_SIZE = 1 << 30
+
+# Bytes of trip text parsed per chunk when streaming
+TRIP_CHUNK_SIZE = 1 << 24
+
+# Trip pairs checked per chunk when streaming compatible pairs
+PAIR_CHUNK_SIZE = 1 << 20
+
+
+def parse_args(description="Taxi Fleet Optimization", solvers=('networkx',), networks=('trip',), parallel=False,
+               frontier=False, rolling=False, ilp=False, timeline=False, routes=False, cache=False, presolve=False,
+               solver_help='Solver backend'):
+    """
+    Parse command line arguments for dataset and distance matrix paths.
+
+    Args:
+        description: Program description
+        solvers: Solver backends the script supports (first one is the default)
+        networks: Network formulations the script supports (first one is the default)
+        parallel: Add the --workers and --timeout options
+        frontier: Add the --frontier option
+        rolling: Add the rolling-horizon options (--window, --overlap, --constraint-mode)
+        ilp: Add the --export and --relaxation options
+        timeline: Add the --timeline option
+        routes: Add the --routes option
+        cache: Add the solution cache options (see add_cache_arguments)
+        presolve: Add the --presolve option
+        solver_help: Help text of --solver
+    """
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument(
         '--trips', '-t',
@@ -30,71 +64,329 @@ def parse_args(description="Taxi Fleet Optimization"):
         default='./data/distance_matrix.txt',
         help='Path to distance matrix file'
     )
+    parser.add_argument(
+        '--max-memory',
+        type=parse_size,
+        default=None,
+        metavar='SIZE',
+        help='Fail fast when the flow network would need more memory than this (e.g. 4G)'
+    )
     parser.add_argument(
         '--no-plot',
         action='store_true',
         help='Disable visualization (for benchmarking)'
     )
+    parser.add_argument(
+        '--solver',
+        choices=solvers,
+        default=solvers[0],
+        help=solver_help
+    )
+    parser.add_argument(
+        '--network',
+        choices=networks,
+        default=networks[0],
+        help="Network formulation ('trip': one edge per compatible pair, "
+             "'time-space': per-location timelines)"
+    )
+    if parallel:
+        parser.add_argument(
+            '--workers', '-w',
+            type=int,
+            default=1,
+            help='Number of worker processes for independent solves'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=None,
+            help='Time limit per solve in seconds (POSIX only)'
+        )
+    if frontier:
+        parser.add_argument(
+            '--frontier',
+            action='store_true',
+            help='Compute the full fleet size vs empty distance Pareto frontier'
+        )
+    if rolling:
+        parser.add_argument(
+            '--window',
+            type=parse_positive_int,
+            default=120,
+            help='Rolling-horizon block length in minutes'
+        )
+        parser.add_argument(
+            '--overlap',
+            type=parse_non_negative_int,
+            default=30,
+            help='Minutes after each block solved again with the next window'
+        )
+        parser.add_argument(
+            '--constraint-mode',
+            choices=('simple', 'start_time', 'end_time', 'combined'),
+            default='simple',
+            help='Trip compatibility rule'
+        )
+    if presolve:
+        parser.add_argument(
+            '--presolve',
+            action='store_true',
+            help='Reduce the flow network before solving'
+        )
+    if timeline:
+        parser.add_argument(
+            '--timeline',
+            default=None,
+            metavar='FILE',
+            help='Save the schedule as a timeline image (.png, .svg or .pdf; one row per taxi)'
+        )
+    if routes:
+        parser.add_argument(
+            '--routes',
+            default=None,
+            metavar='FILE',
+            help='Write the taxi routes to FILE (.csv: one row per trip, .jsonl: one line per taxi)'
+        )
+    if ilp:
+        parser.add_argument(
+            '--export',
+            default=None,
+            metavar='FILE',
+            help='Write the model to FILE (.lp or .mps, gzip-compressed with a .gz suffix)'
+        )
+        parser.add_argument(
+            '--relaxation',
+            action='store_true',
+            help='Solve the LP relaxation with HiGHS; the ILP is only solved if its flow is not integral'
+        )
+    if cache:
+        add_cache_arguments(parser)
+    add_tracing_arguments(parser)
     return parser.parse_args()
 
 
-def file_processing(trips_file, distance_file):
+def add_cache_arguments(parser):
+    """Add the solution cache options (see solution_cache.open_cache) to a parser."""
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always solve, without reading or writing the solution cache'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=SOLUTION_CACHE_DIR,
+        metavar='DIR',
+        help='Solution cache directory'
+    )
+    parser.add_argument(
+        '--cache-size',
+        type=parse_size,
+        default=SOLUTION_CACHE_SIZE,
+        metavar='SIZE',
+        help='Size bound of the solution cache; least recently used entries are evicted (e.g. 500M)'
+    )
+    parser.add_argument(
+        '--cache-graph',
+        action='store_true',
+        help='Also cache the flow networks'
+    )
+
+
+def add_tracing_arguments(parser):
+    """Add the --trace and --profile options (see tracing.session) to a parser."""
+    parser.add_argument(
+        '--trace',
+        nargs='?',
+        const='-',
+        default=None,
+        metavar='FILE',
+        help='Write stage timings and counters as JSON lines to FILE (default: stderr)'
+    )
+    parser.add_argument(
+        '--profile',
+        default=None,
+        metavar='FILE',
+        help='Run under cProfile and dump pstats data to FILE'
+    )
+
+
+def trip_node_names(number_of_trips):
+    """Names of the trip start and end nodes (trip_<i>_start / trip_<i>_end)."""
+    left_nodes = ["trip_" + str(i + 1) + "_start" for i in range(number_of_trips)]
+    right_nodes = ["trip_" + str(i + 1) + "_end" for i in range(number_of_trips)]
+    return left_nodes, right_nodes
+
+
+@tracing.traced('load_trips')
+def load_trip_table(trips_file):
     """
-    Load trips and distance matrix from files.
+    Load a trips file into an int32 table in one vectorized pass.
+
+    Text files (optionally gzip-compressed, *.gz) hold the number of trips on
+    the first line, then one "start,end,pickup,dropoff" line per trip with
+    times as HHMM. They are streamed in chunks, parsed with NumPy and the
+    times converted to minutes. Binary files written by save_trip_table
+    (*.npy) are memory-mapped without any parsing.
 
     Args:
-        trips_file: Path to trips dataset
-        distance_file: Path to distance matrix
+        trips_file: Path to trips dataset (.txt, .txt.gz or .npy)
 
     Returns:
-        trips: List of trip data [start_time, end_time, pickup, dropoff]
-        distances: Distance matrix (upper triangular)
-        number_of_trips: Total number of trips
-        left_nodes: List of trip start node names
-        right_nodes: List of trip end node names
-    """
-    global trips_converter
-
-    trips = list()
-    distances = list()
-    left_nodes = list()
-    right_nodes = list()
-
-    with open(trips_file) as fp:
-        number_of_trips = fp.readline()
-        for i in range(int(number_of_trips)):
-            trip = fp.readline()[:-1]
-            trip_datas = trip.split(',')
-            # Convert HHMM to minutes
-            trip_datas[0], trip_datas[1] = int(trip_datas[0]) // 100 * 60 + (int(trip_datas[0]) % 100), int(trip_datas[1]) // 100 * 60 + (int(trip_datas[1]) % 100)
-
-            trips_converter["trip_" + str(i + 1) + "_start"], trips_converter["trip_" + str(i + 1) + "_end"] = int(trip_datas[2]), int(trip_datas[3])
-
-            left_nodes.append("trip_" + str(i + 1) + "_start")
-            right_nodes.append("trip_" + str(i + 1) + "_end")
-            # trip_datas = list(map(int, trip_datas))
-            trips.append(trip_datas)
+        trips: (n, 4) int32 array with columns start_min, end_min, pickup, dropoff
+    """
+    if trips_file.endswith('.npy'):
+        # Stored column by column: the transpose is a view, not a copy
+        return np.load(trips_file, mmap_mode='r').T
+
+    opener = gzip.open if trips_file.endswith('.gz') else open
+    # Small files are read in one block no larger than the file
+    chunk_size = min(TRIP_CHUNK_SIZE, os.path.getsize(trips_file))
+    chunks = []
+    rest = b''
+    with opener(trips_file, 'rb') as fp:
+        for block in iter(lambda: fp.read(chunk_size), b''):
+            block = rest + block
+            cut = block.rfind(b'\n') + 1
+            block, rest = block[:cut], block[cut:]
+            chunks.append(_parse_numbers(block))
+    chunks.append(_parse_numbers(rest))
+    values = np.concatenate(chunks)
+
+    number_of_trips = int(values[0])
+    trips = values[1:1 + 4 * number_of_trips].reshape(-1, 4)
+    if len(trips) != number_of_trips:
+        raise ValueError(f"{trips_file}: expected {number_of_trips} trips, found {len(trips)}")
+    # Convert HHMM to minutes
+    trips[:, :2] = trips[:, :2] // 100 * 60 + trips[:, :2] % 100
+    return trips.astype(np.int32)
+
+
+def _parse_numbers(text):
+    """All integers in a chunk of comma/whitespace separated text."""
+    return np.fromstring(text.replace(b',', b' ').decode(), dtype=np.int64, sep=' ')
+
+
+def save_trip_table(trips, output_file):
+    """
+    Write a trip table as a binary columnar .npy file for load_trip_table.
+
+    Args:
+        trips: Trip table (see load_trip_table)
+        output_file: Path of the .npy file
+    """
+    np.save(output_file, np.ascontiguousarray(np.asarray(trips, dtype=np.int32).T))
+
+
+@tracing.traced('load_distances')
+def load_distance_matrix(distance_file, cache=True):
+    """
+    Load a distance matrix file into a dense NumPy array.
+
+    The file starts with a header line of location labels, followed by one
+    line per location: its label, then either the upper triangle of its row
+    (from the diagonal on) or the full row. Upper triangular rows are
+    mirrored; full rows are kept as they are, so asymmetric matrices work.
+    Entry [i, j] is the distance from location i to location j; row and
+    column 0 are unused since locations start at 1.
 
+    The parsed matrix is cached as a .npy file named after the SHA-256 of the
+    text file, and later loads memory-map that file instead of parsing.
+    Binary matrices written by save_distance_matrix (*.npy) are memory-mapped
+    directly.
+
+    Args:
+        distance_file: Path to distance matrix (.txt or .npy)
+        cache: Read and write the .npy cache
+
+    Returns:
+        distances: (m + 1) x (m + 1) integer array for m locations
+    """
+    if distance_file.endswith('.npy'):
+        return np.load(distance_file, mmap_mode='r')
+    if not cache:
+        return _parse_distance_matrix(distance_file)
+
+    digest = hashlib.sha256()
+    with open(distance_file, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            digest.update(block)
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(distance_file)), DISTANCE_CACHE_DIR)
+    cache_file = os.path.join(cache_dir, digest.hexdigest() + '.npy')
+    if os.path.exists(cache_file):
+        return np.load(cache_file, mmap_mode='r')
+
+    distances = _parse_distance_matrix(distance_file)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        partial = cache_file + '.' + str(os.getpid()) + '.tmp'
+        with open(partial, 'wb') as fp:
+            np.save(fp, distances)
+        os.replace(partial, cache_file)
+    except OSError:
+        pass  # read-only data directory: just skip the cache
+    return distances
+
+
+def _parse_distance_matrix(distance_file):
+    """Parse the text distance matrix (see load_distance_matrix)."""
     with open(distance_file) as fp:
-        lines = fp.readlines()
-        zero_for_matrixD = -1
-        for line in lines:
-            splited_line = list(map(int, line.split()))
-            if zero_for_matrixD >= 0:
-                splited_line = zero_for_matrixD * [0] + splited_line
-            distances.append(splited_line)
-            zero_for_matrixD += 1
-
-    return trips, distances, int(number_of_trips), left_nodes, right_nodes
-
-
-def get_distance(i, j):
-    """Get distance between locations i and j from the global matrix."""
-    global matrixD
-    # return matrixD[i][j]
+        labels = np.array(fp.readline().split(), dtype=np.int64)
+        size = int(labels.max(initial=0)) + 1
+        dense = np.zeros((size, size), dtype=np.int64)
+        given = np.zeros((size, size), dtype=bool)
+        for line in fp:
+            values = np.array(line.split(), dtype=np.int64)
+            if len(values) == 0:
+                continue
+            row, values = values[0], values[1:]
+            # A short row holds the last len(values) columns (upper triangle)
+            columns = labels[len(labels) - len(values):]
+            dense[row, columns] = values
+            given[row, columns] = True
+
+    mirrored = ~given & given.T
+    dense[mirrored] = dense.T[mirrored]
+    if dense.max(initial=0) <= np.iinfo(np.int32).max:
+        dense = dense.astype(np.int32)
+    return dense
+
+
+def save_distance_matrix(distances, output_file, layout='triangular'):
+    """
+    Write a distance matrix for load_distance_matrix.
+
+    Args:
+        distances: (m + 1) x (m + 1) integer array for m locations (row and column 0 unused)
+        output_file: Output path; .npy writes the dense int32 array, any
+                     other extension the text format
+        layout: Text rows: 'triangular' (upper triangle from the diagonal on,
+                symmetric matrices only) or 'full' (every column)
+    """
+    distances = np.asarray(distances, dtype=np.int32)
+    if output_file.endswith('.npy'):
+        np.save(output_file, distances)
+        return
+    if layout not in ('triangular', 'full'):
+        raise ValueError(f"Unknown distance matrix layout: {layout}")
+    if layout == 'triangular' and not np.array_equal(distances, distances.T):
+        raise ValueError("A triangular distance matrix must be symmetric (use the full layout)")
+
+    size = len(distances)
+    with open(output_file, 'w') as fp:
+        fp.write(' '.join(map(str, range(1, size))) + '\n')
+        for row in range(1, size):
+            values = distances[row, row if layout == 'triangular' else 1:]
+            fp.write(str(row) + ' ' + ' '.join(map(str, values.tolist())) + '\n')
+
+
+def get_distance(distances, i, j):
+    """Get distance from location i to location j."""
+    if isinstance(distances, np.ndarray):
+        return int(distances[i, j])
+    # Legacy upper triangular list of lists
     if i > j:
-        return matrixD[j][i]
-    return matrixD[i][j]
+        return distances[j][i]
+    return distances[i][j]
 
 
 def valid_difference_time(time_end_trip1, time_end_trip2, trip_time2, distance_time):
@@ -118,12 +410,183 @@ def simple_valid_difference_time(time_end_trip1, time_start_trip2, distance_time
     return False
 
 
-def pre_processing(trips, constraint_mode='combined'):
+def trips_to_arrays(trips):
+    """
+    Convert trip rows into NumPy columns.
+
+    Args:
+        trips: List of trip data [start_time, end_time, pickup, dropoff],
+               or an integer array with those columns
+
+    Returns:
+        start, end, pickup, dropoff: int64 arrays of length len(trips)
+    """
+    if isinstance(trips, np.ndarray):
+        table = trips[:, :4].astype(np.int64, copy=False)
+        return table[:, 0], table[:, 1], table[:, 2], table[:, 3]
+    table = np.array([[int(value) for value in trip[:4]] for trip in trips], dtype=np.int64).reshape(-1, 4)
+    return table[:, 0], table[:, 1], table[:, 2], table[:, 3]
+
+
+def distance_array(distances):
+    """
+    Dense distance array: entry [i][j] equals get_distance(distances, i, j).
+
+    Args:
+        distances: Dense array from load_distance_matrix (returned as is, so
+                   a memory-mapped cache is not copied), or a legacy upper
+                   triangular list of lists (expanded symmetrically)
+    """
+    if isinstance(distances, np.ndarray) and distances.ndim == 2:
+        return distances
+    size = len(distances)
+    dense = np.zeros((size, size), dtype=np.int64)
+    for i in range(size):
+        for j in range(size):
+            low, high = min(i, j), max(i, j)
+            if high < len(distances[low]):
+                dense[i, j] = distances[low][high]
+    return dense
+
+
+def _compatibility_columns(trips, distances):
+    """Trip columns, dense distances, trip times and identical-trip groups."""
+    start, end, pickup, dropoff = trips_to_arrays(trips)
+    dense = distance_array(distances)
+    trip_time = dense[pickup, dropoff]
+    table = np.stack((start, end, pickup, dropoff), axis=1)
+    _, group = np.unique(table, axis=0, return_inverse=True)
+    return start, end, pickup, dropoff, dense, trip_time, group.reshape(-1)
+
+
+def _compatibility_rows(columns, rows, constraint_mode):
+    """Compatibility mask of the trips in the slice rows against all trips."""
+    start, end, pickup, dropoff, dense, trip_time, group = columns
+
+    # deadhead[i, j]: empty drive from the dropoff of trip i to the pickup of trip j
+    deadhead = dense[dropoff[rows, None], pickup[None, :]]
+
+    if constraint_mode == 'simple':
+        mask = end[rows, None] + deadhead <= start[None, :]
+    elif constraint_mode == 'end_time':
+        mask = end[rows, None] + deadhead + trip_time[None, :] <= end[None, :]
+    elif constraint_mode == 'start_time':
+        mask = (start + trip_time)[rows, None] + deadhead <= start[None, :]
+    else:  # combined (default)
+        mask = end[rows, None] + deadhead + trip_time[None, :] <= end[None, :]
+        mask |= (start + trip_time)[rows, None] + deadhead <= start[None, :]
+
+    # Identical trips are never chained to each other (nor to themselves)
+    mask &= group[rows, None] != group[None, :]
+    tracing.count('compatibility.checks', mask.size)
+    tracing.count('compatibility.pairs', np.count_nonzero(mask))
+    return mask
+
+
+@tracing.traced('compatibility')
+def compatibility_mask(trips, distances, constraint_mode='combined'):
+    """
+    Evaluate the trip compatibility rule for every pair at once.
+
+    Vectorized equivalent of the valid_difference_time* checks: entry [i, j]
+    is True when trip j can follow trip i under constraint_mode.
+
+    Args:
+        trips: List of trip data
+        distances: Distance matrix
+        constraint_mode: 'combined', 'end_time', 'start_time', or 'simple'
+
+    Returns:
+        mask: Boolean array of shape (n, n)
+    """
+    return _compatibility_rows(_compatibility_columns(trips, distances), slice(None), constraint_mode)
+
+
+def compatible_pairs(trips, distances, constraint_mode='combined', chunk_size=PAIR_CHUNK_SIZE):
+    """
+    Generate the compatible trip pairs in chunks of bounded size.
+
+    Same pairs as compatibility_mask, in the same (row-major) order, but the
+    rule is evaluated on blocks of rows of about chunk_size pairs, so the
+    n x n mask is never held in memory.
+
+    Args:
+        trips: List of trip data
+        distances: Distance matrix
+        constraint_mode: 'combined', 'end_time', 'start_time', or 'simple'
+        chunk_size: Number of pairs checked per chunk
+
+    Yields:
+        tails, heads: int64 arrays of 0-based trip ids, trip heads[k] can follow trip tails[k]
+    """
+    columns = _compatibility_columns(trips, distances)
+    number_of_trips = len(columns[0])
+    rows_per_chunk = max(1, chunk_size // max(number_of_trips, 1))
+    for first in range(0, number_of_trips, rows_per_chunk):
+        rows = slice(first, min(first + rows_per_chunk, number_of_trips))
+        tails, heads = np.nonzero(_compatibility_rows(columns, rows, constraint_mode))
+        yield tails + first, heads
+
+
+def check_memory(required, max_memory, what):
+    """
+    Fail fast when a structure would not fit in the memory ceiling.
+
+    Args:
+        required: Estimated size in bytes
+        max_memory: Memory ceiling in bytes (None for no ceiling)
+        what: Description of the structure, for the error message
+
+    Raises:
+        MemoryError: required is above max_memory
+    """
+    if max_memory is not None and required > max_memory:
+        raise MemoryError(
+            f"{what} needs about {required / 2**20:.0f} MiB, above the memory ceiling of "
+            f"{max_memory / 2**20:.0f} MiB (see --max-memory); use the time-space network "
+            f"or the rolling-horizon solver for instances of this size"
+        )
+
+
+def parse_size(text):
+    """Parse a byte size such as '512M', '4G' or '1000000' (K/M/G/T are powers of 1024)."""
+    units = {'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+    text = text.strip().upper().removesuffix('B')
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r} (expected e.g. 512M or 4G)")
+
+
+def parse_positive_int(text):
+    """Parse an integer greater than 0."""
+    return _parse_bounded_int(text, 1, "> 0")
+
+
+def parse_non_negative_int(text):
+    """Parse an integer greater than or equal to 0."""
+    return _parse_bounded_int(text, 0, ">= 0")
+
+
+def _parse_bounded_int(text, minimum, expected):
+    try:
+        number = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer: {text!r}")
+    if number < minimum:
+        raise argparse.ArgumentTypeError(f"invalid value: {text!r} (expected an integer {expected})")
+    return number
+
+
+def pre_processing(trips, distances, constraint_mode='combined'):
     """
     Build network edges and nodes for the optimization model.
 
     Args:
         trips: List of trip data
+        distances: Distance matrix
         constraint_mode: 'combined', 'end_time', 'start_time', or 'simple'
 
     Returns:
@@ -133,48 +596,9 @@ def pre_processing(trips, constraint_mode='combined'):
     edges = {"back_edge": [], "trip_edge": [], "start_edge": [], "end_edge": [], "garbage_edge": []}
     nodes = list()
 
-    for i in range(len(trips)):
-        for j in range(len(trips)):
-            if trips[i] == trips[j]:
-                continue
-
-            is_compatible = False
-
-            if constraint_mode == 'simple':
-                is_compatible = simple_valid_difference_time(
-                    trips[i][1],
-                    trips[j][0],
-                    get_distance(int(trips[i][3]), int(trips[j][2]))
-                )
-            elif constraint_mode == 'end_time':
-                is_compatible = valid_difference_time(
-                    trips[i][1],
-                    trips[j][1],
-                    get_distance(int(trips[j][2]), int(trips[j][3])),
-                    get_distance(int(trips[i][3]), int(trips[j][2]))
-                )
-            elif constraint_mode == 'start_time':
-                is_compatible = valid_difference_time2(
-                    trips[i][0],
-                    trips[j][0],
-                    get_distance(int(trips[i][2]), int(trips[i][3])),
-                    get_distance(int(trips[i][3]), int(trips[j][2]))
-                )
-            else:  # combined (default)
-                is_compatible = valid_difference_time(
-                    trips[i][1],
-                    trips[j][1],
-                    get_distance(int(trips[j][2]), int(trips[j][3])),
-                    get_distance(int(trips[i][3]), int(trips[j][2]))
-                ) or valid_difference_time2(
-                    trips[i][0],
-                    trips[j][0],
-                    get_distance(int(trips[i][2]), int(trips[i][3])),
-                    get_distance(int(trips[i][3]), int(trips[j][2]))
-                )
-
-            if is_compatible:
-                edges["back_edge"].append(["trip_" + str(i + 1) + "_end", "trip_" + str(j + 1) + "_start"])
+    for rows, cols in compatible_pairs(trips, distances, constraint_mode):
+        edges["back_edge"] += [["trip_" + str(i + 1) + "_end", "trip_" + str(j + 1) + "_start"]
+                               for i, j in zip(rows.tolist(), cols.tolist())]
 
     for i in range(len(trips)):
         # create nodes
@@ -198,20 +622,9 @@ def get_trip_number(name: str):
     return int(name[:end_index]), name[end_index + 1:]
 
 
-def get_state_number(name: str):
-    """Get location number for a trip node."""
-    return trips_converter[name]
-
-
 def calculate_mean_trip_time(trips):
     """Calculate average trip duration in minutes."""
-    if not trips:
+    if len(trips) == 0:
         return 0
-    trip_sum = sum(trip[1] - trip[0] for trip in trips)
-    return trip_sum // len(trips)
-
-
-def set_distance_matrix(distances):
-    """Set the global distance matrix."""
-    global matrixD
-    matrixD = distances
+    start, end, _, _ = trips_to_arrays(trips)
+    return int((end - start).sum()) // len(trips)
@@ -0,0 +1,91 @@
+"""Tests of the on-disk solution cache (src/solution_cache.py)."""
+
+import io
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import tracing
+from instance import ProblemInstance
+from solution_cache import SolutionCache, solve_cached
+
+
+@pytest.fixture
+def instance():
+    # Depot is location 1; trips in minutes (start, end, pickup, dropoff)
+    trips = np.array([[480, 500, 2, 3], [520, 540, 3, 2], [600, 630, 2, 4]], dtype=np.int32)
+    distances = np.array([
+        [0, 0, 0, 0, 0],
+        [0, 0, 5, 6, 7],
+        [0, 5, 0, 4, 6],
+        [0, 6, 4, 0, 3],
+        [0, 7, 6, 3, 0],
+    ])
+    return ProblemInstance(trips, distances)
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    tracer = tracing.Tracer(io.StringIO())
+    monkeypatch.setattr(tracing, '_tracer', tracer)
+    return tracer
+
+
+def solve_fleet(instance):
+    graph = instance.graph(constraint_mode='combined')
+    _, flow_cost, flow = graph.solve(graph.cost('fleet'), instance.number_of_trips)
+    return {'flow_cost': flow_cost}, graph, flow
+
+
+def cached_entry(cache, instance, **kwargs):
+    """Solve once through the cache; return the key and the path of its entry."""
+    solve_cached(cache, instance, 'trip', 'combined', 'fleet', 'networkx', lambda: solve_fleet(instance), **kwargs)
+    key = cache.key(instance, 'trip', 'combined', 'fleet', 'networkx', kwargs.get('presolve', False))
+    return key, os.path.join(cache.directory, key + '.npz')
+
+
+def test_hit_returns_stored_solution(tmp_path, instance):
+    cache = SolutionCache(str(tmp_path))
+    key, _ = cached_entry(cache, instance)
+    values, routes, flow, cached = solve_cached(
+        cache, instance, 'trip', 'combined', 'fleet', 'networkx', lambda: pytest.fail("solved on a hit"))
+    assert cached
+    assert routes.used_taxis == instance.number_of_trips + values['flow_cost']
+
+
+def test_truncated_entry_is_a_miss(tmp_path, instance, tracer):
+    cache = SolutionCache(str(tmp_path))
+    key, path = cached_entry(cache, instance)
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    with open(path, 'wb') as fp:
+        fp.write(data[:len(data) // 2])
+
+    misses = tracer.counters['cache.misses']
+    assert cache.get(key, instance) is None
+    assert tracer.counters['cache.misses'] == misses + 1
+    assert 'cache.hits' not in tracer.counters
+
+
+def test_entry_missing_an_array_is_a_miss(tmp_path, instance, tracer):
+    cache = SolutionCache(str(tmp_path))
+    key, path = cached_entry(cache, instance)
+    with np.load(path) as entry:
+        arrays = {name: entry[name] for name in entry.files if name != 'loop'}
+    np.savez(path, **arrays)
+
+    misses = tracer.counters['cache.misses']
+    assert cache.get(key, instance) is None
+    assert tracer.counters['cache.misses'] == misses + 1
+
+
+def test_presolve_is_part_of_the_key(tmp_path, instance):
+    cache = SolutionCache(str(tmp_path))
+    plain = cache.key(instance, 'trip', 'combined', 'fleet', 'networkx')
+    presolved = cache.key(instance, 'trip', 'combined', 'fleet', 'networkx', presolve=True)
+    assert plain != presolved